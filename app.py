@@ -2,38 +2,361 @@
 # This script creates a Flask web API to serve the employee attrition prediction model,
 # now including a basic web form for user-friendly input.
 
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, request, jsonify, render_template_string, Response, stream_with_context, g
+import hmac
+import os
 import pickle
+import shutil
+import tempfile
+import threading
+import time
+from collections import namedtuple
 import numpy as np
-import pandas as pd
+from feature_schema import FeatureSchema, FEATURE_SCHEMA_FILE
+from forest_engine import FlatForest, FLAT_FOREST_DIR, FUSED_FOREST_DIR, MODEL_VARIANTS_DIR, MANIFEST_FILE
+from forest_explainer import ForestExplainer
+from instrumentation import REGISTRY, REQUESTS, REQUEST_LATENCY, ROWS_SCORED, stage, profiler_from_env
+from micro_batcher import MicroBatcher
+from model_registry import ModelRegistry, REGISTRY_DIR
+from prediction_cache import PredictionCache
+from scoring import score_matrix, format_prediction, format_explanation, strongest_features, detect_format, iter_record_chunks, iter_scored_chunks, DEFAULT_CHUNK_ROWS
 
 app = Flask(__name__)
 
-# --- Load Saved Model and Scaler ---
-print("--- Loading saved model and scaler ---")
-try:
-    model = pickle.load(open("model.pkl", "rb"))
-    scaler = pickle.load(open("scaler.pkl", "rb"))
-    print("Model and Scaler loaded successfully!")
-except FileNotFoundError:
-    print("Error: 'model.pkl' or 'scaler.pkl' not found.")
-    print("Please ensure you have run 'model_dev.py' successfully to create these files in the same folder.")
-    model = None
-    scaler = None
-except Exception as e:
-    print(f"An unexpected error occurred while loading model/scaler: {e}")
-    model = None
-    scaler = None
+# --- Choose the inference engine ---
+# ATTRITION_ENGINE=sklearn (default): serve the pickled RandomForestClassifier from model.pkl.
+# ATTRITION_ENGINE=flat: serve the flattened forest in model_flat/ (written by model_dev.py).
+#   It returns exactly the same probabilities with much less per-call overhead for small batches.
+# ATTRITION_ENGINE=fused: serve model_fused/, the flattened forest with the scaler folded into its
+#   thresholds. Only this one artifact is loaded and requests skip scaler.transform entirely.
+# The flat and fused artifacts are memory-mapped, so all worker processes share one copy of the forest.
+ENGINE = os.environ.get('ATTRITION_ENGINE', 'sklearn')
+
+# --- Optionally serve a smaller model variant ---
+# model_dev.py also saves cut-down versions of the forest in model_variants/ (fewer trees, shallower
+# trees, smaller thresholds; see compression_report.json for their size, speed and accuracy).
+# ATTRITION_MODEL_VARIANT=<name> serves model_variants/<name>/ (of the current registry version)
+# instead of the full model, with the flat engine and scaler.pkl.
+MODEL_VARIANT = os.environ.get('ATTRITION_MODEL_VARIANT') or None
+if MODEL_VARIANT:
+    ENGINE = 'flat' # what actually serves a variant (and what the logs, /stats and /metrics report)
+
+# Files each engine reads (the prediction cache also watches them for changes)
+ENGINE_FILES = {
+    'sklearn': ["model.pkl", "scaler.pkl"],
+    'flat': [os.path.join(FLAT_FOREST_DIR, MANIFEST_FILE), "scaler.pkl"],
+    'fused': [os.path.join(FUSED_FOREST_DIR, MANIFEST_FILE)],
+}
+if MODEL_VARIANT:
+    MODEL_FILES = [os.path.join(MODEL_VARIANTS_DIR, MODEL_VARIANT, MANIFEST_FILE), "scaler.pkl"]
+else:
+    MODEL_FILES = ENGINE_FILES.get(ENGINE, [])
+
+# --- Model versions ---
+# model_dev.py publishes every trained model as a new version in the registry (models/<version>/,
+# see model_registry.py) and moves the models/CURRENT pointer to it. Every worker checks that pointer
+# in the background and switches to the new version without a restart. Without a registry, the files
+# next to app.py are served as version 'unversioned' (and not reloaded).
+#   ATTRITION_REGISTRY_DIR=models        where the versions live
+#   ATTRITION_RELOAD_INTERVAL=2          seconds between checks of models/CURRENT (0 turns hot reload off)
+#   ATTRITION_ADMIN_TOKEN=<secret>       the /admin endpoints require this X-Admin-Token header (they are
+#                                        disabled, 403 for everyone, while no token is configured)
+registry = ModelRegistry(os.environ.get('ATTRITION_REGISTRY_DIR', REGISTRY_DIR))
+UNVERSIONED = 'unversioned'
+RELOAD_INTERVAL = float(os.environ.get('ATTRITION_RELOAD_INTERVAL', 2.0))
+ADMIN_TOKEN = os.environ.get('ATTRITION_ADMIN_TOKEN') or None
+
+# Everything a request needs from one model version. A ServingModel is never modified: a reload builds
+# a complete new one and replaces the `serving` reference with a single assignment. Each request reads
+# `serving` once, so it uses one consistent model + scaler + feature schema + version without taking any lock.
+# The explainer holds the per-leaf feature contributions /explain needs (see forest_explainer.py).
+ServingModel = namedtuple('ServingModel', ['version', 'model', 'scaler', 'schema', 'explainer'])
+
+# --- Load Saved Model and Scaler (lazily) ---
+# Nothing is loaded at import time, so starting a worker is cheap. The model is loaded by the first
+# request that needs it, or up front by preload_model() - call that in the parent process of a pre-fork
+# server (see gunicorn.conf.py) so forked workers start with the model already in place.
+serving = None
+_load_lock = threading.Lock()
+_watcher_started = False
+_watcher_stop = None # threading.Event that ends the running watcher thread
+_watcher_thread = None
+
+def load_serving_model(version):
+    # Load one version (None = the unversioned files next to app.py) and warm it up with one prediction,
+    # so the first request it answers doesn't pay for lazy initialisation. Raises if anything is missing.
+    base_dir = registry.version_path(version) if version else '.'
+    if MODEL_VARIANT:
+        new_model = FlatForest.load(os.path.join(base_dir, MODEL_VARIANTS_DIR, MODEL_VARIANT))
+        with open(os.path.join(base_dir, "scaler.pkl"), "rb") as f:
+            new_scaler = pickle.load(f)
+    elif ENGINE == 'fused':
+        new_model = FlatForest.load(os.path.join(base_dir, FUSED_FOREST_DIR))
+        new_scaler = None # Already folded into the model's thresholds
+    elif ENGINE in ('flat', 'sklearn'):
+        if ENGINE == 'flat':
+            new_model = FlatForest.load(os.path.join(base_dir, FLAT_FOREST_DIR))
+        else:
+            with open(os.path.join(base_dir, "model.pkl"), "rb") as f:
+                new_model = pickle.load(f)
+        with open(os.path.join(base_dir, "scaler.pkl"), "rb") as f:
+            new_scaler = pickle.load(f)
+    else:
+        raise ValueError(f"Unknown ATTRITION_ENGINE '{ENGINE}'. Use 'sklearn', 'flat' or 'fused'.")
+    # Versions published before feature_schema.json existed use the schema next to app.py
+    schema_path = os.path.join(base_dir, FEATURE_SCHEMA_FILE)
+    new_schema = FeatureSchema.load(schema_path) if os.path.exists(schema_path) else feature_schema
+    if new_schema.n_features != new_model.n_features_in_:
+        raise ValueError(f"Feature schema has {new_schema.n_features} features but the model expects {new_model.n_features_in_}.")
+    score_matrix(new_model, new_scaler, np.zeros((1, new_model.n_features_in_)))
+    new_explainer = ForestExplainer.from_model(new_model) # the sklearn model is flattened once, here
+    return ServingModel(version or UNVERSIONED, new_model, new_scaler, new_schema, new_explainer)
+
+def _ensure_loaded():
+    # Returns the ServingModel, loading the current version on first use; None if it can't be loaded.
+    global serving
+    if serving is not None:
+        return serving
+    with _load_lock:
+        if serving is not None:
+            return serving
+        version = registry.current_version()
+        print(f"--- Loading saved model and scaler (engine: {ENGINE}{f', variant: {MODEL_VARIANT}' if MODEL_VARIANT else ''}, version: {version or UNVERSIONED}) ---")
+        start_time = time.perf_counter()
+        try:
+            serving = load_serving_model(version)
+        except FileNotFoundError as fe:
+            print(f"Error: '{fe.filename}' not found.")
+            print("Please ensure you have run 'model_dev.py' successfully to create these files in the same folder.")
+            return None
+        except Exception as e:
+            print(f"An unexpected error occurred while loading model/scaler: {e}")
+            return None
+        print(f"Model and Scaler loaded successfully in {(time.perf_counter() - start_time) * 1000:.1f} ms!")
+        return serving
+
+def load_model():
+    # Used by every endpoint: returns the ServingModel to answer this request with (or None on failure).
+    state = _ensure_loaded()
+    if state is not None and not _watcher_started and RELOAD_INTERVAL > 0:
+        start_model_watcher()
+    return state
+
+def preload_model():
+    # Load and warm up the model now. No watcher thread is started here: threads don't survive fork(),
+    # so each worker starts its own on its first request.
+    return _ensure_loaded() is not None
+
+def reload_model(version):
+    # Load and warm `version` next to the one being served, then switch to it with one assignment.
+    # Requests already running finish on the old version; if loading fails, the old version keeps serving.
+    global serving
+    with _load_lock:
+        if serving is not None and serving.version == version:
+            return serving
+        start_time = time.perf_counter()
+        new_state = load_serving_model(version)
+        old_version = serving.version if serving is not None else None
+        serving = new_state
+        print(f"Switched model version {old_version} -> {version} (loaded and warmed in {(time.perf_counter() - start_time) * 1000:.1f} ms).")
+        return new_state
+
+def start_model_watcher():
+    global _watcher_started, _watcher_stop, _watcher_thread
+    with _init_lock:
+        if _watcher_started:
+            return
+        _watcher_stop = threading.Event()
+        _watcher_thread = threading.Thread(target=_watch_current_version, args=(registry, _watcher_stop),
+                                           name='model-watcher', daemon=True)
+        _watcher_thread.start()
+        _watcher_started = True
+
+def stop_model_watcher(timeout=5.0):
+    # Ask the watcher thread to exit and wait for it. load_model() starts a new one when needed.
+    global _watcher_started, _watcher_thread
+    with _init_lock:
+        if _watcher_stop is not None:
+            _watcher_stop.set()
+        thread, _watcher_thread = _watcher_thread, None
+        _watcher_started = False
+    if thread is not None and thread is not threading.current_thread():
+        thread.join(timeout)
+
+def _watch_current_version(watched_registry, stop):
+    # Poll models/CURRENT and hot-swap when it points at a different version.
+    # A version that fails to load is not retried until the pointer changes again.
+    # Exits when stopped, when hot reload is turned off (RELOAD_INTERVAL <= 0), or when the app has been
+    # pointed at a different registry than the one this thread was started for.
+    failed_version = None
+    while RELOAD_INTERVAL > 0 and not stop.wait(RELOAD_INTERVAL):
+        if registry is not watched_registry:
+            break
+        version = None
+        state = serving
+        try:
+            version = watched_registry.current_version()
+            if version is None or state is None or version == state.version or version == failed_version:
+                continue
+            reload_model(version)
+        except Exception as e:
+            failed_version = version
+            print(f"Could not load model version {version}, still serving {state.version if state is not None else None}: {e}")
+
+def _reset_after_fork():
+    # A forked worker inherits the flag but not the thread
+    global _watcher_started, _watcher_stop, _watcher_thread
+    _watcher_started = False
+    _watcher_stop = _watcher_thread = None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
 
 # --- Define expected feature names ---
-expected_features_order = ['Age', 'DailyRate', 'DistanceFromHome', 'Education', 'EnvironmentSatisfaction',
-                           'HourlyRate', 'JobInvolvement', 'JobLevel', 'JobSatisfaction', 'MonthlyIncome',
-                           'MonthlyRate', 'NumCompaniesWorked', 'PercentSalaryHike', 'PerformanceRating',
-                           'RelationshipSatisfaction', 'StockOptionLevel', 'TotalWorkingYears',
-                           'TrainingTimesLastYear', 'WorkLifeBalance', 'YearsAtCompany', 'YearsInCurrentRole',
-                           'YearsSinceLastPromotion', 'YearsWithCurrManager',
-                           'BusinessTravel', 'Department', 'EducationField', 'Gender', 'JobRole',
-                           'MaritalStatus', 'OverTime']
+# The feature order and the category codes come from feature_schema.json, written by model_dev.py
+# with the model (see feature_schema.py). Categorical features can be sent as their text value
+# ("Travel_Rarely") or as the numeric code it was encoded to (2).
+# Each model version carries its own copy; this one is used until a model is loaded.
+feature_schema = FeatureSchema.load(FEATURE_SCHEMA_FILE)
+expected_features_order = feature_schema.feature_order
+
+def current_schema():
+    state = serving
+    return state.schema if state is not None else feature_schema
+
+# Upper bound on how many employees a single /predict_batch or /explain request may carry.
+MAX_BATCH_ROWS = 100000
+# Number of strongest contributions /explain lists in 'top_factors' (override with ?top=<n>).
+DEFAULT_TOP_FACTORS = 5
+
+# --- Optional micro-batching of single-row requests ---
+# When enabled, concurrent /predict and /predict_form calls that arrive within a short window
+# are scored together in one forest call. Configure with environment variables:
+#   ATTRITION_MICROBATCH=1                 turn it on (off by default)
+#   ATTRITION_MICROBATCH_MAX_ROWS=64       score a batch as soon as it has this many rows
+#   ATTRITION_MICROBATCH_WAIT_MS=2         ...or this long after its first row arrived
+MICROBATCH_ENABLED = os.environ.get('ATTRITION_MICROBATCH', '0') == '1'
+
+# --- Prediction cache ---
+# Repeated requests for the same employee are answered from a bounded LRU cache, keyed on a hash of
+# the ordered feature vector. Entries are dropped automatically when the model files change.
+#   ATTRITION_CACHE_SIZE=10000     max cached predictions (0 turns the cache off)
+#   ATTRITION_CACHE_TTL=0          seconds before an entry expires (0 = never)
+#   ATTRITION_CACHE_PATH=<file>    also keep entries in this SQLite file so they survive restarts
+CACHE_SIZE = int(os.environ.get('ATTRITION_CACHE_SIZE', 10000))
+
+# The batcher's thread and the cache's SQLite connection must not be shared across fork(),
+# so both are created in the worker process on first use.
+micro_batcher = None
+prediction_cache = None
+_init_lock = threading.Lock()
+
+def get_micro_batcher():
+    global micro_batcher
+    if micro_batcher is None and MICROBATCH_ENABLED:
+        with _init_lock:
+            if micro_batcher is None:
+                # Rows are grouped by the ServingModel their request read, so a batch never mixes versions
+                micro_batcher = MicroBatcher(lambda input_array, state: score_matrix(state.model, state.scaler, input_array),
+                                             max_batch_rows=int(os.environ.get('ATTRITION_MICROBATCH_MAX_ROWS', 64)),
+                                             max_wait_ms=float(os.environ.get('ATTRITION_MICROBATCH_WAIT_MS', 2.0)))
+                print(f"Micro-batching enabled (up to {micro_batcher.max_batch_rows} rows or {micro_batcher.max_wait * 1000:g} ms per batch).")
+    return micro_batcher
+
+def get_prediction_cache():
+    global prediction_cache
+    if prediction_cache is None and CACHE_SIZE > 0:
+        with _init_lock:
+            if prediction_cache is None:
+                # Keys are namespaced by model version; watching the files covers unversioned models replaced in place
+                prediction_cache = PredictionCache(max_entries=CACHE_SIZE,
+                                                   ttl_seconds=float(os.environ.get('ATTRITION_CACHE_TTL', 0)),
+                                                   persist_path=os.environ.get('ATTRITION_CACHE_PATH') or None,
+                                                   watch_paths=MODEL_FILES)
+    return prediction_cache
+
+def score_rows(state, input_array):
+    # Batch scoring: cached rows are answered directly, the rest go to the model in one call
+    cache = get_prediction_cache()
+    if cache is not None:
+        return cache.score(input_array, lambda misses: score_matrix(state.model, state.scaler, misses), namespace=state.version)
+    return score_matrix(state.model, state.scaler, input_array)
+
+def score_single_row(state, input_array):
+    # Single-row requests check the cache first, then go through the micro-batcher when it is enabled
+    batcher = get_micro_batcher()
+    if batcher is not None:
+        def score_fn(rows):
+            with stage('microbatch'): # waiting for the batch + scoring it in the batcher thread
+                return batcher.score(rows, state)
+    else:
+        score_fn = lambda rows: score_matrix(state.model, state.scaler, rows)
+    cache = get_prediction_cache()
+    if cache is not None:
+        return cache.score(input_array, score_fn, namespace=state.version)
+    return score_fn(input_array)
+
+def explain_rows(state, input_array):
+    # Probabilities + per-feature contributions in one pass over the trees (no cache or micro-batching)
+    with stage('scale'):
+        data_scaled = state.scaler.transform(input_array) if state.scaler is not None else input_array
+    with stage('explain'):
+        return state.explainer.explain(data_scaled)
+
+# --- Shared scoring helpers ---
+# These let the single-row endpoints and the batch endpoint share one code path.
+def build_feature_row(data, schema=None):
+    # Encode one record into a 1-row array in the schema's feature order (no pandas DataFrame per request).
+    # Raises KeyError for a missing feature and ValueError for a value that can't be encoded.
+    return (schema or feature_schema).encode_record(data)
+
+def build_feature_matrix(records, schema=None):
+    # Encode a list of records column by column (see FeatureSchema.encode_records).
+    # Records that can't be encoded get a per-row error instead of failing the whole batch.
+    return (schema or feature_schema).encode_records(records)
+
+# --- Instrumentation ---
+# Every request is counted and timed per endpoint, and the prediction path is timed stage by stage
+# (see instrumentation.py). Everything is exposed in the Prometheus format on /metrics.
+# With ATTRITION_PROFILE_SLOW_MS set, the stacks of slow requests are also dumped for flame graphs.
+profiler = profiler_from_env()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if profiler is not None:
+        profiler.begin()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    duration = time.perf_counter() - g.request_start
+    REQUESTS.inc(1, endpoint, response.status_code)
+    REQUEST_LATENCY.observe(duration, endpoint)
+    return response
+
+@app.teardown_request
+def finish_request_profile(exc):
+    if profiler is not None and 'request_start' in g:
+        profiler.end(request.path, time.perf_counter() - g.request_start)
+
+def serving_metrics():
+    # Scrape-time values from the model, prediction cache and micro-batcher
+    state = serving
+    if state is not None:
+        yield ('attrition_model_info', 'Model version being served.', 'gauge', {'version': state.version, 'engine': ENGINE, 'variant': MODEL_VARIANT or 'full'}, 1)
+    if prediction_cache is not None:
+        cache_stats = prediction_cache.stats()
+        for key in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+            yield (f'attrition_cache_{key}_total', f'Prediction cache {key}.', 'counter', {}, cache_stats[key])
+        yield ('attrition_cache_entries', 'Entries in the prediction cache.', 'gauge', {}, cache_stats['entries'])
+    if micro_batcher is not None:
+        batcher_stats = micro_batcher.stats()
+        yield ('attrition_microbatch_queue_depth', 'Rows waiting for the micro-batcher.', 'gauge', {}, batcher_stats['queue_depth'])
+        yield ('attrition_microbatch_batches_total', 'Batches scored by the micro-batcher.', 'counter', {}, batcher_stats['batches_scored'])
+        yield ('attrition_microbatch_rows_total', 'Rows scored by the micro-batcher.', 'counter', {}, batcher_stats['rows_scored'])
+
+REGISTRY.collectors.append(serving_metrics)
 
 # --- HTML Template for the form ---
 # We are embedding the HTML directly in the Python code for simplicity.
@@ -51,7 +374,7 @@ HTML_FORM_TEMPLATE = """
         h1, h2 { color: #0056b3; }
         form div { margin-bottom: 10px; }
         label { display: inline-block; width: 200px; font-weight: bold; }
-        input[type="number"], input[type="text"] { width: calc(100% - 220px); padding: 8px; border: 1px solid #ddd; border-radius: 4px; }
+        input[type="number"], input[type="text"], select { width: calc(100% - 220px); padding: 8px; border: 1px solid #ddd; border-radius: 4px; }
         button { padding: 10px 20px; background-color: #007bff; color: white; border: none; border-radius: 5px; cursor: pointer; font-size: 16px; }
         button:hover { background-color: #0056b3; }
         .note { font-size: 0.9em; color: #666; margin-top: 20px; border-top: 1px solid #eee; padding-top: 10px; }
@@ -68,7 +391,15 @@ HTML_FORM_TEMPLATE = """
             {% for feature in features %}
             <div>
                 <label for="{{ feature }}">{{ feature }}:</label>
+                {% if feature in categories %}
+                <select id="{{ feature }}" name="{{ feature }}" required>
+                    {% for level in categories[feature] %}
+                    <option value="{{ level }}" {% if initial_values.get(feature, '') | string in (level, loop.index0 | string) %}selected{% endif %}>{{ level }}</option>
+                    {% endfor %}
+                </select>
+                {% else %}
                 <input type="number" id="{{ feature }}" name="{{ feature }}" value="{{ initial_values.get(feature, '') }}" required>
+                {% endif %}
             </div>
             {% endfor %}
             <button type="submit">Get Prediction</button>
@@ -80,6 +411,7 @@ HTML_FORM_TEMPLATE = """
             <p><strong>Prediction:</strong> {{ prediction_result.prediction }}</p>
             <p><strong>Probability (No Attrition):</strong> {{ "%.2f" | format(prediction_result.probability_no_attrition) }}</p>
             <p><strong>Probability (Yes Attrition):</strong> {{ "%.2f" | format(prediction_result.probability_yes_attrition) }}</p>
+            <p><strong>Model version:</strong> {{ prediction_result.model_version }}</p>
         </div>
         {% endif %}
 
@@ -92,15 +424,11 @@ HTML_FORM_TEMPLATE = """
 
         <div class="note">
             <h3>Note on Categorical Features:</h3>
-            <p>Please enter numerical values for the following features as they were converted during model training:</p>
+            <p>Categorical features are picked by name above. The JSON API accepts either the name or the numerical code it was converted to during model training (from feature_schema.json):</p>
             <ul>
-                <li><strong>BusinessTravel:</strong> 0 (No Travel), 1 (Travel_Frequently), 2 (Travel_Rarely)</li>
-                <li><strong>Department:</strong> 0 (Human Resources), 1 (Research & Development), 2 (Sales)</li>
-                <li><strong>EducationField:</strong> (depends on your specific encoding, e.g., 0 for HR, 1 for Life Sciences, etc.) - Refer to your `model_dev.py`'s LabelEncoder output if unsure.</li>
-                <li><strong>Gender:</strong> 0 (Female), 1 (Male)</li>
-                <li><strong>JobRole:</strong> (numerical value based on your specific encoding, e.g., 0-8)</li>
-                <li><strong>MaritalStatus:</strong> 0 (Divorced), 1 (Married), 2 (Single)</li>
-                <li><strong>OverTime:</strong> 0 (No), 1 (Yes)</li>
+                {% for feature, levels in categories.items() %}
+                <li><strong>{{ feature }}:</strong> {% for level in levels %}{{ loop.index0 }} ({{ level }}){% if not loop.last %}, {% endif %}{% endfor %}</li>
+                {% endfor %}
             </ul>
             <p>The example values in the form are for demonstration. Use values that make sense for your data.</p>
         </div>
@@ -112,45 +440,293 @@ HTML_FORM_TEMPLATE = """
 # --- Define API Endpoints ---
 @app.route('/')
 def home():
-    return "<h1>Welcome to the Employee Attrition Predictor API!</h1><p>Send a POST request to /predict for JSON API or visit /predict_form for web interface.</p>"
+    return "<h1>Welcome to the Employee Attrition Predictor API!</h1><p>Send a POST request to /predict for JSON API, POST a JSON array to /predict_batch to score many employees at once, upload a CSV/NDJSON file to /predict_file, POST one employee or an array to /explain to see which features drove the prediction, or visit /predict_form for web interface.</p>"
+
+# Serving statistics (micro-batching queue depth and batch sizes, prediction cache hits / misses / evictions)
+@app.route('/stats')
+def stats():
+    state = serving
+    return jsonify({
+        'model': {'engine': ENGINE, 'variant': MODEL_VARIANT, 'version': state.version if state is not None else None},
+        'micro_batching': get_micro_batcher().stats() if MICROBATCH_ENABLED else {'enabled': False},
+        'prediction_cache': get_prediction_cache().stats() if CACHE_SIZE > 0 else {'enabled': False}
+    })
+
+# Prometheus metrics: request counts / latency, per-stage timings, cache and micro-batching figures
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# --- /predict and /predict_batch request handling ---
+# Shared by the Flask views below and by asgi_app.py's pool processes, so both serve the same contract.
+# Each takes the loaded ServingModel and the parsed JSON body and returns (status, response dict).
+# score: how predict_record scores its row (asgi_app.py's single-threaded pool processes skip the micro-batcher).
+def predict_record(state, data, score=score_single_row):
+    if not isinstance(data, dict):
+        return 400, {'error': 'Invalid input format. Expected a JSON object (dictionary).'}
+    try:
+        # Convert the incoming JSON data to a single feature row, ensuring column order
+        with stage('build_features'):
+            input_array = build_feature_row(data, state.schema)
+        if not np.isfinite(input_array).all():
+            return 400, {'error': "Invalid feature value: NaN or infinity. All features must be finite numbers."}
+
+        # Scale and make prediction
+        with stage('score'):
+            prediction, prediction_proba = score(state, input_array)
+
+        with stage('format_response'):
+            response = format_prediction(prediction[0], prediction_proba[0])
+            response['model_version'] = state.version
+            return 200, response
+
+    except KeyError as ke:
+        return 400, {'error': f"Missing input feature: {ke}. Please provide all expected features."}
+    except ValueError as ve:
+        return 400, {'error': f"Invalid feature value: {ve}"}
+    except Exception as e:
+        return 500, {'error': f"An error occurred during prediction: {str(e)}", "message": "Ensure your input data matches the model's expectations (data types, completeness, feature order, and proper encoding for categorical values if applicable)."}
+
+def predict_records(state, data):
+    if not isinstance(data, list):
+        return 400, {'error': 'Invalid input format. Expected a JSON array of objects (dictionaries).'}
+    if len(data) > MAX_BATCH_ROWS:
+        return 413, {'error': f"Batch too large: {len(data)} records. The maximum is {MAX_BATCH_ROWS} per request."}
+
+    try:
+        with stage('build_features'):
+            feature_matrix, valid_rows, row_errors = build_feature_matrix(data, state.schema)
+
+        # One vectorized scaling + forest pass over all valid rows
+        results = [None] * len(data)
+        if valid_rows.any():
+            with stage('score'):
+                prediction, prediction_proba = score_rows(state, feature_matrix[valid_rows])
+            with stage('format_response'):
+                for j, i in enumerate(np.flatnonzero(valid_rows)):
+                    results[i] = format_prediction(prediction[j], prediction_proba[j])
+        for i, message in row_errors.items():
+            results[i] = {'error': message}
+
+        return 200, {
+            'predictions': results,
+            'n_rows': len(data),
+            'n_errors': len(row_errors),
+            'model_version': state.version
+        }
+
+    except Exception as e:
+        return 500, {'error': f"An error occurred during batch prediction: {str(e)}"}
+
+def rows_scored(status, response):
+    # How many rows a predict_record / predict_records response scored (for the rows-scored metric)
+    if status != 200:
+        return 0
+    return response['n_rows'] - response['n_errors'] if 'predictions' in response else 1
 
 # JSON API endpoint (existing)
 @app.route('/predict', methods=['POST'])
 def predict_json():
-    if model is None or scaler is None:
+    state = load_model()
+    if state is None:
+        return jsonify({'error': 'Model or scaler not loaded on server.'}), 500
+    with stage('parse_json'):
+        data = request.get_json(silent=True)
+    status, response = predict_record(state, data)
+    ROWS_SCORED.inc(rows_scored(status, response), '/predict')
+    return jsonify(response), status
+
+# Batch JSON API endpoint: scores a whole list of employees in one request
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    state = load_model()
+    if state is None:
+        return jsonify({'error': 'Model or scaler not loaded on server.'}), 500
+    with stage('parse_json'):
+        data = request.get_json(silent=True)
+    status, response = predict_records(state, data)
+    ROWS_SCORED.inc(rows_scored(status, response), '/predict_batch')
+    with stage('format_response'):
+        return jsonify(response), status
+
+# Explanation endpoint: why was an employee flagged?
+# POST one employee (JSON object) or many (JSON array, same per-row errors as /predict_batch).
+# Each result is the /predict result plus:
+#   bias            the average attrition probability the forest starts from (the training base rate)
+#   contributions   {feature: how much it moved probability_yes_attrition}; bias + their sum = the probability
+#   top_factors     the ?top=<n> (default 5) largest contributions by size, with the values that were sent
+# Computed in one pass over the trees from contributions cached at model load (see forest_explainer.py).
+# Measured with benchmark_api.py (sklearn engine, no cache): one employee takes ~1.6 ms vs ~3.8 ms for /predict;
+# 256 employees ~29 ms vs ~15 ms for /predict_batch, most of it encoding 30 contributions per row as JSON.
+@app.route('/explain', methods=['POST'])
+def explain():
+    state = load_model()
+    if state is None:
         return jsonify({'error': 'Model or scaler not loaded on server.'}), 500
 
+    with stage('parse_json'):
+        data = request.get_json(silent=True)
+    single = isinstance(data, dict)
+    records = [data] if single else data
+    if not isinstance(records, list):
+        return jsonify({'error': 'Invalid input format. Expected a JSON object or an array of objects (dictionaries).'}), 400
+    if len(records) > MAX_BATCH_ROWS:
+        return jsonify({'error': f"Batch too large: {len(records)} records. The maximum is {MAX_BATCH_ROWS} per request."}), 413
     try:
-        data = request.json
-
-        if not isinstance(data, dict):
-            return jsonify({'error': 'Invalid input format. Expected a JSON object (dictionary).'}), 400
-
-        # Convert the incoming JSON data to a pandas DataFrame, ensuring column order
-        input_df = pd.DataFrame([data], columns=expected_features_order)
-        input_array = input_df.values
+        top = int(request.args.get('top', DEFAULT_TOP_FACTORS))
+    except ValueError:
+        return jsonify({'error': 'top must be an integer.'}), 400
 
-        # Scale the input data using the loaded scaler
-        data_scaled = scaler.transform(input_array)
+    try:
+        with stage('build_features'):
+            feature_matrix, valid_rows, row_errors = build_feature_matrix(records, state.schema)
+        if single and row_errors:
+            return jsonify({'error': row_errors[0]}), 400
+
+        results = [None] * len(records)
+        if valid_rows.any():
+            prediction_proba, contributions = explain_rows(state, feature_matrix[valid_rows])
+            prediction = state.model.classes_.take(np.argmax(prediction_proba, axis=1))
+            ROWS_SCORED.inc(len(prediction), '/explain')
+            with stage('format_response'):
+                strongest = strongest_features(contributions, top).tolist()
+                contributions = contributions.tolist()
+                for j, i in enumerate(np.flatnonzero(valid_rows)):
+                    results[i] = format_explanation(prediction[j], prediction_proba[j], contributions[j], strongest[j],
+                                                    state.explainer.bias, state.schema.feature_order, records[i])
+        for i, message in row_errors.items():
+            results[i] = {'error': message}
+
+        with stage('format_response'):
+            if single:
+                return jsonify({**results[0], 'model_version': state.version})
+            return jsonify({
+                'explanations': results,
+                'n_rows': len(records),
+                'n_errors': len(row_errors),
+                'model_version': state.version
+            })
 
-        # Make Prediction
-        prediction = model.predict(data_scaled)
-        prediction_proba = model.predict_proba(data_scaled)
+    except Exception as e:
+        return jsonify({'error': f"An error occurred during explanation: {str(e)}"}), 500
+
+# Bulk file scoring endpoint: upload a CSV or NDJSON file shaped like employee_data.csv
+# (raw text categories are fine) and get the results streamed back chunk by chunk.
+# Send it either as a multipart form field named "file" or as the raw request body.
+# Query parameters: format=csv|ndjson (input), output=ndjson|csv, chunk_rows=<int>.
+@app.route('/predict_file', methods=['POST'])
+def predict_file():
+    state = load_model()
+    if state is None:
+        return jsonify({'error': 'Model or scaler not loaded on server.'}), 500
 
-        churn_status = "Yes Attrition" if prediction[0] == 1 else "No Attrition"
+    upload = None
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'error': "No file uploaded. Send the file in a form field named 'file'."}), 400
 
-        response = {
-            'prediction': churn_status,
-            'raw_prediction': int(prediction[0]),
-            'probability_no_attrition': float(prediction_proba[0][0]),
-            'probability_yes_attrition': float(prediction_proba[0][1])
-        }
-        return jsonify(response)
+    # Check the query parameters before touching the upload
+    default_format = 'ndjson' if 'json' in (request.mimetype or '') else 'csv'
+    input_format = request.args.get('format') or detect_format(upload.filename if upload is not None else None, default=default_format)
+    output_format = request.args.get('output', 'ndjson')
+    try:
+        chunk_rows = int(request.args.get('chunk_rows', DEFAULT_CHUNK_ROWS))
+    except ValueError:
+        return jsonify({'error': 'chunk_rows must be an integer.'}), 400
+    if input_format not in ('csv', 'ndjson'):
+        return jsonify({'error': f"Unsupported input format: {input_format!r}. Use 'csv' or 'ndjson'."}), 400
+    if chunk_rows <= 0 or output_format not in ('ndjson', 'csv'):
+        return jsonify({'error': "chunk_rows must be positive and output must be 'ndjson' or 'csv'."}), 400
+
+    if upload is not None:
+        # Werkzeug closes uploaded files when the view returns, but we keep reading while streaming.
+        # Copy the upload (already spooled by Werkzeug) into our own temporary file first.
+        source = tempfile.TemporaryFile()
+        shutil.copyfileobj(upload.stream, source)
+        source.seek(0)
+    else:
+        # Raw body: read straight from the request stream without buffering it in memory
+        source = request.stream
+
+    def score_chunk(input_array):
+        ROWS_SCORED.inc(len(input_array), '/predict_file')
+        return score_matrix(state.model, state.scaler, input_array)
+
+    # Open the reader and score the first chunk before responding, so bad files (empty, missing columns,
+    # unparseable) still get a proper 400
+    try:
+        scored_chunks = iter_scored_chunks(iter_record_chunks(source, input_format, chunk_rows), score_chunk, output_format, schema=state.schema)
+        first_chunk = next(scored_chunks, '')
+    except Exception as e:
+        source.close()
+        return jsonify({'error': f"Could not read uploaded file: {str(e)}"}), 400
 
-    except KeyError as ke:
-        return jsonify({'error': f"Missing input feature: {ke}. Please provide all expected features."}), 400
+    def generate():
+        try:
+            yield first_chunk
+            yield from scored_chunks
+        finally:
+            source.close()
+
+    mimetype = 'application/x-ndjson' if output_format == 'ndjson' else 'text/csv'
+    # The whole file is scored by the version read above, even if a new one is activated mid-stream
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers={'X-Model-Version': state.version})
+
+# --- Model registry admin endpoints ---
+# GET  /admin/models                       list published versions and the one this worker is serving
+# POST /admin/models/<version>/activate    switch to a version
+# POST /admin/models/rollback              switch back to the previously active version
+# The version is loaded and warmed in this worker before the pointer moves, so a broken version is
+# rejected here instead of being picked up by every worker. Other workers follow within RELOAD_INTERVAL.
+def admin_denied():
+    if not ADMIN_TOKEN:
+        return jsonify({'error': 'Admin endpoints are disabled. Set ATTRITION_ADMIN_TOKEN to enable them.'}), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': 'Missing or invalid X-Admin-Token header.'}), 403
+    return None
+
+@app.route('/admin/models')
+def admin_list_models():
+    denied = admin_denied()
+    if denied:
+        return denied
+    state = serving
+    return jsonify({
+        'current': registry.current_version(),
+        'serving': state.version if state is not None else None,
+        'previous': registry.previous_version(),
+        'versions': registry.list_versions()
+    })
+
+@app.route('/admin/models/<version>/activate', methods=['POST'])
+def admin_activate_model(version):
+    denied = admin_denied()
+    if denied:
+        return denied
+    if version not in [entry['version'] for entry in registry.list_versions()]:
+        return jsonify({'error': f"Unknown model version '{version}'."}), 404
+    try:
+        reload_model(version)
+    except Exception as e:
+        return jsonify({'error': f"Could not load model version '{version}': {str(e)}"}), 500
+    registry.activate(version)
+    return jsonify({'current': version, 'serving': serving.version})
+
+@app.route('/admin/models/rollback', methods=['POST'])
+def admin_rollback_model():
+    denied = admin_denied()
+    if denied:
+        return denied
+    version = registry.previous_version()
+    if version is None:
+        return jsonify({'error': 'No earlier version to roll back to.'}), 409
+    try:
+        reload_model(version)
     except Exception as e:
-        return jsonify({'error': f"An error occurred during prediction: {str(e)}", "message": "Ensure your input data matches the model's expectations (data types, completeness, feature order, and proper encoding for categorical values if applicable)."}), 500
+        return jsonify({'error': f"Could not load model version '{version}': {str(e)}"}), 500
+    registry.rollback()
+    return jsonify({'current': version, 'serving': serving.version})
 
 # New web form endpoint for user-friendly input
 @app.route('/predict_form', methods=['GET', 'POST'])
@@ -158,57 +734,48 @@ def predict_form():
     prediction_result = None
     error_message = None
     initial_values = {}
+    schema = current_schema()
 
     if request.method == 'POST':
-        if model is None or scaler is None:
+        state = load_model()
+        if state is None:
             error_message = 'Model or scaler not loaded on server. Please check server logs.'
-            return render_template_string(HTML_FORM_TEMPLATE, features=expected_features_order, prediction_result=prediction_result, error_message=error_message, initial_values=initial_values)
+            return render_template_string(HTML_FORM_TEMPLATE, features=schema.feature_order, categories=schema.categories, prediction_result=prediction_result, error_message=error_message, initial_values=initial_values)
+        schema = state.schema
 
         try:
             # Get data from form
             form_data = request.form.to_dict()
             initial_values = form_data # To repopulate the form
 
-            # Convert form data to correct types (all from form are strings)
-            # Make sure numerical features are int/float
-            # Categorical features are expected as numerical input from the form
+            # All form values are strings: numbers are parsed and category names ("Travel_Rarely")
+            # are converted to their codes by the feature schema
             processed_data = {}
-            for feature in expected_features_order:
+            for feature in schema.feature_order:
                 val = form_data.get(feature)
                 if val is None:
                     raise KeyError(feature) # Ensure all features are provided
+                processed_data[feature] = val
 
-                # Attempt to convert to number, assuming all features are numerical after encoding
-                try:
-                    processed_data[feature] = float(val) if '.' in val else int(val)
-                except ValueError:
-                    error_message = f"Invalid value for {feature}. Please enter a numerical value."
-                    return render_template_string(HTML_FORM_TEMPLATE, features=expected_features_order, prediction_result=prediction_result, error_message=error_message, initial_values=initial_values)
-
-
-            input_df = pd.DataFrame([processed_data], columns=expected_features_order)
-            input_array = input_df.values
-
-            # Scale the input data
-            data_scaled = scaler.transform(input_array)
-
-            # Make Prediction
-            prediction = model.predict(data_scaled)
-            prediction_proba = model.predict_proba(data_scaled)
+            with stage('build_features'):
+                input_array = build_feature_row(processed_data, schema)
+            if not np.isfinite(input_array).all():
+                raise ValueError("All features must be finite numbers.")
 
-            churn_status = "Yes Attrition" if prediction[0] == 1 else "No Attrition"
+            # Scale and make prediction
+            with stage('score'):
+                prediction, prediction_proba = score_single_row(state, input_array)
+            ROWS_SCORED.inc(1, '/predict_form')
 
-            prediction_result = {
-                'prediction': churn_status,
-                'raw_prediction': int(prediction[0]),
-                'probability_no_attrition': float(prediction_proba[0][0]),
-                'probability_yes_attrition': float(prediction_proba[0][1])
-            }
+            prediction_result = format_prediction(prediction[0], prediction_proba[0])
+            prediction_result['model_version'] = state.version
 
         except KeyError as ke:
             error_message = f"Missing input for feature: {ke}. Please fill in all fields."
+        except ValueError as ve:
+            error_message = f"{ve} Please enter a valid value."
         except Exception as e:
-            error_message = f"An error occurred during prediction: {str(e)}. Ensure all fields have valid numerical values."
+            error_message = f"An error occurred during prediction: {str(e)}. Ensure all fields have valid values."
     
     # Pre-fill some default/example values for a more user-friendly initial form load
     # You might want to get these from your employee_data.csv for realistic examples
@@ -221,15 +788,17 @@ def predict_form():
             "PerformanceRating": 3, "RelationshipSatisfaction": 3, "StockOptionLevel": 1,
             "TotalWorkingYears": 7, "TrainingTimesLastYear": 2, "WorkLifeBalance": 3,
             "YearsAtCompany": 5, "YearsInCurrentRole": 3, "YearsSinceLastPromotion": 1,
-            "YearsWithCurrManager": 4, "BusinessTravel": 2, "Department": 2,
-            "EducationField": 1, "Gender": 0, "JobRole": 7, "MaritalStatus": 2, "OverTime": 1
+            "YearsWithCurrManager": 4, "BusinessTravel": "Travel_Rarely", "Department": "Sales",
+            "EducationField": "Life Sciences", "Gender": "Female", "JobRole": "Sales Executive",
+            "MaritalStatus": "Single", "OverTime": "Yes"
         }
 
 
-    return render_template_string(HTML_FORM_TEMPLATE, features=expected_features_order, prediction_result=prediction_result, error_message=error_message, initial_values=initial_values)
+    return render_template_string(HTML_FORM_TEMPLATE, features=schema.feature_order, categories=schema.categories, prediction_result=prediction_result, error_message=error_message, initial_values=initial_values)
 
 
 if __name__ == '__main__':
+    preload_model()
     print("\n--- Starting Flask API server ---")
     print("API is running locally. You can access it at:")
     print("  Home page: http://127.0.0.1:5000/")
@@ -0,0 +1,270 @@
+# asgi_app.py
+# Async (ASGI) entry point for the attrition API, as an alternative to running app.py's Flask server.
+# Requests are parsed and validated on an asyncio event loop, and the CPU-bound forest evaluation is
+# sent to a pool of worker processes, so scoring runs on all cores instead of behind one GIL.
+# - Every pool process loads the model once (the same loading, engines and hot reload as app.py).
+# - At most ATTRITION_MAX_QUEUE scoring jobs may be queued or running; beyond that, requests are
+#   answered right away with 503 + Retry-After instead of piling up and blowing up tail latency.
+# - /predict and /predict_batch accept and return exactly what app.py's endpoints do. The raw request
+#   body is handed to the pool: the pool process parses it, encodes the records with the feature schema
+#   of the model version it serves, scores them and serializes the response. The event loop only moves
+#   bytes, so a 100k-row batch never blocks other requests, and records are always encoded with the
+#   schema of the model that scores them (this process loads no model).
+#
+# Configure with environment variables:
+#   ATTRITION_POOL_WORKERS=<n>     scoring processes (default: number of CPU cores)
+#   ATTRITION_MAX_QUEUE=<n>        max scoring jobs queued + running (default: 8 per pool process)
+#   ATTRITION_MAX_BODY_MB=128      largest request body accepted
+#
+# Usage (any ASGI server; use a single server worker, the process pool provides the parallelism):
+#   uvicorn asgi_app:app --host 0.0.0.0 --port 8000
+#   python asgi_app.py             (same thing, if uvicorn is installed)
+
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import app as flask_app
+from instrumentation import REGISTRY, REQUESTS, REQUEST_LATENCY, ROWS_SCORED
+
+POOL_WORKERS = int(os.environ.get('ATTRITION_POOL_WORKERS', os.cpu_count() or 1))
+MAX_QUEUE = int(os.environ.get('ATTRITION_MAX_QUEUE', POOL_WORKERS * 8))
+MAX_BODY_BYTES = int(float(os.environ.get('ATTRITION_MAX_BODY_MB', 128)) * 1024 * 1024)
+
+JSON_HEADERS = [(b'content-type', b'application/json')]
+
+
+# --- Functions run inside the pool processes ---
+def _init_worker():
+    # Runs once when a pool process starts: load and warm up the model for this process
+    flask_app.preload_model()
+
+# Each takes the raw request body and returns (status, JSON response body, rows scored). They use whatever
+# version this process is serving (hot reload included), for both its feature schema and its model, and
+# share app.py's request handling (predict_record / predict_records), so both servers answer alike.
+def _reply(status, response, n_rows=0):
+    return status, json.dumps(response).encode(), n_rows
+
+def _handle_in_worker(handler, body, **kwargs):
+    state = flask_app.load_model()
+    if state is None:
+        return _reply(500, {'error': 'Model or scaler not loaded on server.'})
+    status, response = handler(state, parse_json(body), **kwargs)
+    return _reply(status, response, flask_app.rows_scored(status, response))
+
+def _predict_in_worker(body):
+    return _handle_in_worker(flask_app.predict_record, body, score=flask_app.score_rows)
+
+def _predict_batch_in_worker(body):
+    return _handle_in_worker(flask_app.predict_records, body)
+
+def _ping():
+    return os.getpid()
+
+
+class PoolSaturated(Exception):
+    pass
+
+
+class ScoringPool:
+    # Process pool with a bound on outstanding jobs. Only used from the event loop thread,
+    # so the counters need no lock.
+    def __init__(self, n_workers=POOL_WORKERS, max_queue=MAX_QUEUE):
+        self.n_workers = n_workers
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._executor = None
+
+    def start(self):
+        # 'spawn' gives every pool process a clean interpreter (no threads or locks inherited from the server)
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.n_workers, initializer=_init_worker,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+
+    async def warm_up(self):
+        # Start every pool process now (each loads its model), so the first requests don't wait for it
+        self.start()
+        loop = asyncio.get_running_loop()
+        pids = await asyncio.gather(*(loop.run_in_executor(self._executor, _ping) for _ in range(self.n_workers)))
+        print(f"Scoring pool ready: {len(set(pids))} processes, at most {self.max_queue} jobs in flight.")
+
+    async def run(self, fn, *args):
+        # Returns fn(*args), run in a pool process; raises PoolSaturated when the queue is full.
+        if self.in_flight >= self.max_queue:
+            self.rejected += 1
+            raise PoolSaturated()
+        self.start()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            result = await asyncio.wrap_future(self._executor.submit(fn, *args))
+            self.completed += 1
+            return result
+        except BrokenProcessPool:
+            # A pool process died (e.g. killed for memory); replace the pool so later requests work again
+            print("Scoring pool broke, starting a new one.")
+            self.shutdown(wait=False)
+            self.restarts += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    def stats(self):
+        return {
+            'workers': self.n_workers,
+            'max_queue': self.max_queue,
+            'in_flight': self.in_flight,
+            'max_in_flight': self.max_in_flight,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'restarts': self.restarts
+        }
+
+
+pool = ScoringPool()
+
+def pool_metrics():
+    # Scoring pool figures for /metrics (stage timings happen inside the pool processes and are not included)
+    pool_stats = pool.stats()
+    yield ('attrition_pool_workers', 'Scoring pool processes.', 'gauge', {}, pool_stats['workers'])
+    yield ('attrition_pool_in_flight', 'Scoring jobs queued or running.', 'gauge', {}, pool_stats['in_flight'])
+    yield ('attrition_pool_max_queue', 'Most scoring jobs allowed in flight.', 'gauge', {}, pool_stats['max_queue'])
+    yield ('attrition_pool_rejected_total', 'Requests answered with 503 because the pool was saturated.', 'counter', {}, pool_stats['rejected'])
+
+REGISTRY.collectors.append(pool_metrics)
+
+
+# --- Request / response helpers ---
+async def read_body(receive):
+    # Returns the request body, or None if it is larger than MAX_BODY_BYTES
+    chunks, size = [], 0
+    while True:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+async def send_response(send, status, body, headers=JSON_HEADERS):
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': headers + [(b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+def parse_json(body):
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+BUSY_RESPONSE = {'error': 'Server is busy: too many predictions in progress. Please retry shortly.'}
+BUSY_HEADERS = JSON_HEADERS + [(b'retry-after', b'1')]
+
+
+# --- Endpoints (same request / response contract as app.py) ---
+POST_ROUTES = {'/predict': _predict_in_worker, '/predict_batch': _predict_batch_in_worker}
+
+async def handle_post(path, body):
+    # Returns (status, JSON response body); raises PoolSaturated when the queue is full
+    try:
+        status, response_body, n_rows = await pool.run(POST_ROUTES[path], body)
+    except PoolSaturated:
+        raise
+    except Exception as e:
+        # The pool process failed (e.g. it died); app.py's catch-all error responses
+        action = 'prediction' if path == '/predict' else 'batch prediction'
+        return 500, {'error': f"An error occurred during {action}: {str(e)}"}
+    if n_rows:
+        ROWS_SCORED.inc(n_rows, path)
+    return status, response_body
+
+
+async def handle_http(scope, receive, send):
+    path, method = scope['path'], scope['method']
+    if path == '/' and method == 'GET':
+        return await send_response(send, 200, b"<h1>Welcome to the Employee Attrition Predictor API!</h1><p>Send a POST request to /predict for JSON API, or POST a JSON array to /predict_batch to score many employees at once.</p>",
+                                   headers=[(b'content-type', b'text/html; charset=utf-8')])
+    if path == '/stats' and method == 'GET':
+        return await send_response(send, 200, {'scoring_pool': pool.stats()})
+    if path == '/metrics' and method == 'GET':
+        return await send_response(send, 200, REGISTRY.render().encode(),
+                                   headers=[(b'content-type', b'text/plain; version=0.0.4; charset=utf-8')])
+    if path not in POST_ROUTES:
+        return await send_response(send, 404, {'error': 'Not found.'})
+    if method != 'POST':
+        return await send_response(send, 405, {'error': 'Method not allowed. Use POST.'}, headers=JSON_HEADERS + [(b'allow', b'POST')])
+
+    # Reject early when saturated, before reading and parsing a body we won't score
+    if pool.in_flight >= pool.max_queue:
+        pool.rejected += 1
+        return await send_response(send, 503, BUSY_RESPONSE, headers=BUSY_HEADERS)
+    body = await read_body(receive)
+    if body is None:
+        return await send_response(send, 413, {'error': f"Request body too large. The maximum is {MAX_BODY_BYTES} bytes."})
+    try:
+        status, response = await handle_post(path, body)
+    except PoolSaturated:
+        return await send_response(send, 503, BUSY_RESPONSE, headers=BUSY_HEADERS)
+    await send_response(send, status, response)
+
+
+async def handle_lifespan(receive, send):
+    # Start (and warm) the pool when the server starts, and stop it on shutdown
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                await pool.warm_up()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            pool.shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'http':
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_and_record(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        await handle_http(scope, receive, send_and_record)
+        endpoint = scope['path'] if scope['path'] in ('/', '/stats', '/metrics', *POST_ROUTES) else 'unmatched'
+        REQUESTS.inc(1, endpoint, status[0])
+        REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint)
+    elif scope['type'] == 'lifespan':
+        await handle_lifespan(receive, send)
+
+
+if __name__ == '__main__':
+    try:
+        import uvicorn
+    except ImportError:
+        print("uvicorn is not installed. Install it with 'pip install uvicorn', or run asgi_app:app with any ASGI server.")
+        raise SystemExit(1)
+    print("\n--- Starting ASGI API server ---")
+    print(f"Scoring with {POOL_WORKERS} worker processes (at most {MAX_QUEUE} jobs in flight).")
+    uvicorn.run('asgi_app:app', host='0.0.0.0', port=int(os.environ.get('PORT', 8000)), workers=1)
@@ -0,0 +1,291 @@
+# benchmark_api.py
+# Load-testing harness for the prediction API: replays employees sampled from employee_data.csv
+# (or request bodies from a JSONL file) against the endpoints at several concurrency levels and
+# batch sizes, and reports latency percentiles, requests/sec and rows/sec.
+# Results are written as JSON, so two runs (e.g. before / after a commit) can be compared with --compare.
+#
+# Targets:
+#   --target flask   call app.py in-process through Flask's test client (default, no network)
+#   --target local   start app.py on a local threaded HTTP server and send real HTTP requests
+#   --url <base>     send HTTP requests to an already running server (app.py, gunicorn or asgi_app.py)
+#
+# The prediction cache is turned off for the flask and local targets unless --cache is given: the same
+# sampled payloads are replayed in every run, so with the cache on, later runs would mostly measure hits.
+# For --url, the server's own cache setting applies (recorded from its /stats in the results).
+#
+# Usage:
+#   python benchmark_api.py
+#   python benchmark_api.py --target local --concurrency 1 8 32 --requests 2000 -o after.json --compare before.json
+#   python benchmark_api.py --url http://127.0.0.1:8000 --endpoints predict predict_batch
+#   python benchmark_api.py --endpoints predict predict_batch explain     (cost of /explain vs /predict)
+
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+ENDPOINTS = ['predict', 'predict_form', 'predict_batch', 'predict_file', 'explain']
+# /explain is only served by app.py, so it is benchmarked on request (--endpoints ... explain)
+DEFAULT_ENDPOINTS = ['predict', 'predict_form', 'predict_batch', 'predict_file']
+DEFAULT_BATCH_SIZES = [16, 256]
+
+
+# --- Request bodies ---
+def sample_employees(n_rows, seed, replay_path=None):
+    # Returns (JSON feature dicts in app.py's order, matching raw CSV rows) for n_rows sampled employees
+    from app import expected_features_order
+    from scoring import prepare_features
+    raw = pd.read_csv('employee_data.csv')
+    picks = np.random.default_rng(seed).integers(0, len(raw), n_rows)
+    if replay_path:
+        with open(replay_path) as f:
+            bodies = [json.loads(line) for line in f if line.strip()]
+        return [bodies[i % len(bodies)] for i in range(n_rows)], raw.iloc[picks]
+    feature_matrix, _ = prepare_features(raw)
+    bodies = [dict(zip(expected_features_order, feature_matrix[i].tolist())) for i in picks]
+    return bodies, raw.iloc[picks]
+
+def build_scenarios(endpoints, batch_sizes, n_payloads, seed, replay_path):
+    # One scenario per (endpoint, rows per request); each has a list of ready-to-send payloads
+    bodies, raw_rows = sample_employees(n_payloads * max([1] + batch_sizes), seed, replay_path)
+    scenarios = []
+    if 'predict' in endpoints:
+        scenarios.append({'endpoint': 'predict', 'rows': 1, 'payloads': [{'json': body} for body in bodies[:n_payloads]]})
+    if 'predict_form' in endpoints:
+        scenarios.append({'endpoint': 'predict_form', 'rows': 1,
+                          'payloads': [{'form': {k: str(v) for k, v in body.items()}} for body in bodies[:n_payloads]]})
+    if 'explain' in endpoints:
+        scenarios.append({'endpoint': 'explain', 'rows': 1, 'payloads': [{'json': body} for body in bodies[:n_payloads]]})
+    for batch_size in batch_sizes:
+        starts = [i * batch_size for i in range(n_payloads)]
+        if 'predict_batch' in endpoints:
+            scenarios.append({'endpoint': 'predict_batch', 'rows': batch_size,
+                              'payloads': [{'json': bodies[s:s + batch_size]} for s in starts]})
+        if 'predict_file' in endpoints:
+            scenarios.append({'endpoint': 'predict_file', 'rows': batch_size,
+                              'payloads': [{'file': raw_rows.iloc[s:s + batch_size].to_csv(index=False).encode()} for s in starts]})
+        if 'explain' in endpoints:
+            scenarios.append({'endpoint': 'explain', 'rows': batch_size,
+                              'payloads': [{'json': bodies[s:s + batch_size]} for s in starts]})
+    return scenarios
+
+
+# --- Clients ---
+class FlaskClient:
+    # In-process: goes through the whole Flask request handling without a socket
+    def __init__(self):
+        import app
+        self.client = app.app.test_client()
+
+    def post(self, path, payload):
+        if 'json' in payload:
+            response = self.client.post(path, json=payload['json'])
+        elif 'form' in payload:
+            response = self.client.post(path, data=payload['form'])
+        else:
+            response = self.client.post(path, data={'file': (io.BytesIO(payload['file']), 'employees.csv')},
+                                        content_type='multipart/form-data')
+        return response.status_code, response.get_data(as_text=True)
+
+class HttpClient:
+    # Real HTTP with a keep-alive session (one per benchmark thread)
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.session = requests.Session()
+
+    def post(self, path, payload):
+        url = self.base_url + path
+        if 'json' in payload:
+            response = self.session.post(url, json=payload['json'])
+        elif 'form' in payload:
+            response = self.session.post(url, data=payload['form'])
+        else:
+            response = self.session.post(url, files={'file': ('employees.csv', payload['file'])})
+        return response.status_code, response.text
+
+def start_local_server():
+    # app.py on a threaded HTTP server on a free local port; returns its base URL
+    from werkzeug.serving import make_server
+    import app
+    app.preload_model()
+    server = make_server('127.0.0.1', 0, app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def succeeded(endpoint, status, body):
+    # The form answers 200 even on errors, so look for the result block
+    return status == 200 and (endpoint != 'predict_form' or 'Prediction Result' in body)
+
+
+# --- Runner ---
+def run_scenario(make_client, scenario, n_requests, concurrency, warmup):
+    payloads, path = scenario['payloads'], '/' + scenario['endpoint']
+    latencies = np.zeros(n_requests)
+    failed = np.zeros(n_requests, dtype=bool)
+    first_error = []
+    next_request = itertools.count()
+
+    def worker():
+        client = make_client()
+        for i in range(warmup):
+            client.post(path, payloads[i % len(payloads)])
+        start_barrier.wait()
+        while True:
+            i = next(next_request)
+            if i >= n_requests:
+                return
+            start = time.perf_counter()
+            try:
+                status, body = client.post(path, payloads[i % len(payloads)])
+                failed[i] = not succeeded(scenario['endpoint'], status, body)
+                if failed[i] and not first_error:
+                    first_error.append(f"HTTP {status}: {body[:200]}")
+            except Exception as e:
+                failed[i] = True
+                if not first_error:
+                    first_error.append(str(e))
+            latencies[i] = time.perf_counter() - start
+
+    start_barrier = threading.Barrier(concurrency + 1)
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    ok = ~failed
+    latency_ms = latencies * 1000
+    p50, p95, p99 = np.percentile(latency_ms, [50, 95, 99])
+    return {
+        'endpoint': scenario['endpoint'],
+        'rows_per_request': scenario['rows'],
+        'concurrency': concurrency,
+        'requests': n_requests,
+        'errors': int(failed.sum()),
+        'first_error': first_error[0] if first_error else None,
+        'duration_s': duration,
+        'requests_per_s': ok.sum() / duration,
+        'rows_per_s': ok.sum() * scenario['rows'] / duration,
+        'latency_ms': {'mean': latency_ms.mean(), 'p50': p50, 'p95': p95, 'p99': p99, 'max': latency_ms.max()}
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def in_process_cache_size():
+    import app
+    return app.CACHE_SIZE
+
+def server_cache_size(base_url):
+    # max_entries of a running server's prediction cache (0 if off), or None if its /stats doesn't say
+    try:
+        import requests
+        cache = requests.get(base_url.rstrip('/') + '/stats', timeout=5).json().get('prediction_cache')
+    except Exception:
+        return None
+    if not isinstance(cache, dict):
+        return None
+    return cache.get('max_entries', 0) if cache.get('enabled') else 0
+
+def scenario_key(result):
+    return (result['endpoint'], result['rows_per_request'], result['concurrency'])
+
+
+# --- Reports ---
+def print_results(results, baseline=None):
+    previous = {scenario_key(r): r for r in (baseline or {}).get('results', [])}
+    print(f"\n{'endpoint':<15}{'rows':>6}{'conc':>6}{'req/s':>10}{'rows/s':>11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+          + (f"{'p50 vs base':>13}{'req/s vs base':>15}" if baseline else ''))
+    for r in results:
+        line = (f"{r['endpoint']:<15}{r['rows_per_request']:>6}{r['concurrency']:>6}{r['requests_per_s']:>10.1f}"
+                f"{r['rows_per_s']:>11.1f}{r['latency_ms']['p50']:>9.2f}{r['latency_ms']['p95']:>9.2f}"
+                f"{r['latency_ms']['p99']:>9.2f}{r['errors']:>8}")
+        old = previous.get(scenario_key(r))
+        if old:
+            line += (f"{(r['latency_ms']['p50'] / old['latency_ms']['p50'] - 1) * 100:>+12.1f}%"
+                     f"{(r['requests_per_s'] / old['requests_per_s'] - 1) * 100:>+14.1f}%")
+        print(line)
+        if r['first_error']:
+            print(f"    first error: {r['first_error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark latency and throughput of the prediction API.")
+    parser.add_argument('--target', choices=['flask', 'local'], default='flask', help="In-process Flask test client, or app.py on a local HTTP server.")
+    parser.add_argument('--url', help="Benchmark an already running server at this base URL instead.")
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=DEFAULT_ENDPOINTS)
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 8], help="Concurrent clients (one run per value).")
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=DEFAULT_BATCH_SIZES, help="Rows per request for /predict_batch and /predict_file.")
+    parser.add_argument('--requests', type=int, default=500, help="Requests per scenario (default: 500).")
+    parser.add_argument('--warmup', type=int, default=5, help="Unmeasured requests per client before each run.")
+    parser.add_argument('--replay', help="JSONL file of /predict request bodies to replay instead of sampling employee_data.csv.")
+    parser.add_argument('--cache', action='store_true', help="Keep app.py's prediction cache on (ATTRITION_CACHE_SIZE) for the in-process / local targets.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('-o', '--output', default='benchmark_api_results.json', help="Where to write the JSON results.")
+    parser.add_argument('--compare', help="Earlier results file to compare against.")
+    args = parser.parse_args(argv)
+
+    if not args.url and not args.cache:
+        import app
+        app.CACHE_SIZE = 0
+        app.prediction_cache = None
+    if args.url:
+        target, base_url = 'url', args.url
+    elif args.target == 'local':
+        target, base_url = 'local', start_local_server()
+    else:
+        target, base_url = 'flask', None
+    make_client = (lambda: HttpClient(base_url)) if base_url else FlaskClient
+
+    print(f"--- Benchmarking {base_url or 'app.py (in-process)'} ---")
+    scenarios = build_scenarios(args.endpoints, args.batch_sizes, min(args.requests, 1000), args.seed, args.replay)
+    results = []
+    for scenario in scenarios:
+        for concurrency in args.concurrency:
+            result = run_scenario(make_client, scenario, args.requests, concurrency, args.warmup)
+            results.append(result)
+            print(f"  {scenario['endpoint']:<14} rows={scenario['rows']:<5} concurrency={concurrency:<4} "
+                  f"{result['requests_per_s']:8.1f} req/s  p99 {result['latency_ms']['p99']:.2f} ms")
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_commit': git_commit(),
+            'target': target,
+            'url': base_url,
+            'engine': os.environ.get('ATTRITION_ENGINE', 'sklearn'),
+            'cache_size': server_cache_size(base_url) if target == 'url' else in_process_cache_size(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'requests_per_scenario': args.requests
+        },
+        'results': results
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2, default=float)
+    print(f"\nResults written to '{args.output}'.")
+    return 0 if not any(r['errors'] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
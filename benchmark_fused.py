@@ -0,0 +1,73 @@
+# benchmark_fused.py
+# Per-request latency of the preprocessing + inference path for single-employee requests:
+#   original : pandas DataFrame -> scaler.transform -> model.predict + model.predict_proba (the old /predict body)
+#   sklearn  : preallocated NumPy row -> scaler.transform -> model.predict_proba once
+#   flat     : preallocated NumPy row -> scaler.transform -> flattened forest (model_flat/)
+#   fused    : preallocated NumPy row -> flattened forest with the scaler folded in (model_fused/)
+#
+# Usage:
+#   python benchmark_fused.py [number_of_requests]
+
+import pickle
+import sys
+import time
+import numpy as np
+import pandas as pd
+from app import build_feature_row, expected_features_order
+from forest_engine import FlatForest, FLAT_FOREST_DIR, FUSED_FOREST_DIR
+from scoring import prepare_features, score_matrix
+
+
+def sample_requests(n_requests):
+    # JSON-like request bodies built from real employees in employee_data.csv
+    feature_matrix, valid_rows = prepare_features(pd.read_csv('employee_data.csv'))
+    employees = feature_matrix[valid_rows]
+    picks = np.random.default_rng(42).integers(0, len(employees), n_requests)
+    return [dict(zip(expected_features_order, employees[i].tolist())) for i in picks]
+
+
+def time_path(handler, requests):
+    latencies = np.empty(len(requests))
+    for i, data in enumerate(requests):
+        start = time.perf_counter()
+        handler(data)
+        latencies[i] = time.perf_counter() - start
+    return latencies * 1e6 # microseconds
+
+
+def main():
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    model = pickle.load(open("model.pkl", "rb"))
+    scaler = pickle.load(open("scaler.pkl", "rb"))
+    flat_forest = FlatForest.load(FLAT_FOREST_DIR)
+    fused_forest = FlatForest.load(FUSED_FOREST_DIR)
+
+    def original(data):
+        input_array = pd.DataFrame([data], columns=expected_features_order).values
+        data_scaled = scaler.transform(input_array)
+        return model.predict(data_scaled), model.predict_proba(data_scaled)
+
+    paths = {
+        'original': original,
+        'sklearn': lambda data: score_matrix(model, scaler, build_feature_row(data)),
+        'flat': lambda data: score_matrix(flat_forest, scaler, build_feature_row(data)),
+        'fused': lambda data: score_matrix(fused_forest, None, build_feature_row(data)),
+    }
+
+    requests = sample_requests(n_requests)
+    reference = np.vstack([original(data)[1] for data in requests[:50]])
+    print(f"\n--- Per-request latency over {n_requests} single-employee requests (microseconds) ---")
+    print(f"{'path':<10}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'speedup':>10}")
+    baseline = None
+    for name, handler in paths.items():
+        # Every path must give the same answer as the original one
+        assert np.array_equal(np.vstack([handler(data)[1] for data in requests[:50]]), reference), name
+        handler(requests[0]) # warm up
+        latencies = time_path(handler, requests)
+        baseline = baseline or np.median(latencies)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(f"{name:<10}{latencies.mean():>10.1f}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}{baseline / p50:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
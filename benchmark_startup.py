@@ -0,0 +1,123 @@
+# benchmark_startup.py
+# Cold-start time and per-worker memory for each inference engine, the way a pre-fork server runs them:
+# the parent imports app.py and preloads the model, then forks workers that each serve some predictions.
+# The 'sklearn, per-worker load' row is the old behaviour: every worker unpickles its own copy of model.pkl.
+# Every engine is measured in a fresh Python process. Linux only (reads /proc/<pid>/smaps_rollup).
+#
+# Usage:
+#   python benchmark_startup.py [number_of_workers]
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+# (label, ATTRITION_ENGINE, load the model in the parent before forking?)
+SCENARIOS = [
+    ('sklearn, per-worker load', 'sklearn', False),
+    ('sklearn, preloaded', 'sklearn', True),
+    ('flat, preloaded', 'flat', True),
+    ('fused, preloaded', 'fused', True),
+]
+
+
+def memory_kb():
+    # Rss / Pss / Shared / Private memory of this process, in kB
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {
+        'rss_kb': fields.get('Rss', 0),
+        'pss_kb': fields.get('Pss', 0),
+        'shared_kb': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+        'private_kb': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0),
+    }
+
+
+def measure_engine(n_workers, preload_in_parent):
+    # Runs inside the child process started by main(), with ATTRITION_ENGINE already set
+    import pandas as pd
+    from scoring import prepare_features
+
+    start = time.perf_counter()
+    import app
+    import_ms = (time.perf_counter() - start) * 1000
+    if preload_in_parent:
+        app.preload_model()
+    cold_start_ms = (time.perf_counter() - start) * 1000
+    parent_memory = memory_kb()
+
+    feature_matrix, _ = prepare_features(pd.read_csv('employee_data.csv'))
+    workers = []
+    for _ in range(n_workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Worker: serve single-row and batch predictions, then report its memory
+            os.close(read_fd)
+            if not preload_in_parent:
+                worker_start = time.perf_counter()
+                app.preload_model()
+                os.write(write_fd, json.dumps({'cold_start_ms': (time.perf_counter() - worker_start) * 1000}).encode() + b'\n')
+            state = app.serving
+            for i in range(200):
+                app.score_matrix(state.model, state.scaler, feature_matrix[i:i + 1])
+            app.score_matrix(state.model, state.scaler, feature_matrix)
+            os.write(write_fd, json.dumps(memory_kb()).encode() + b'\n')
+            os.close(write_fd)
+            time.sleep(1.0) # stay alive until every worker has reported, so shared pages count as shared
+            os._exit(0)
+        os.close(write_fd)
+        workers.append((pid, read_fd))
+
+    worker_memory = []
+    for pid, read_fd in workers:
+        with os.fdopen(read_fd) as f:
+            reports = [json.loads(line) for line in f.read().splitlines()]
+        if not preload_in_parent:
+            # Each worker paid for its own load; count the slowest one
+            cold_start_ms = max(cold_start_ms, import_ms + reports[0]['cold_start_ms'])
+        worker_memory.append(reports[-1])
+    for pid, _ in workers:
+        os.waitpid(pid, 0)
+
+    return {
+        'import_ms': import_ms,
+        'cold_start_ms': cold_start_ms,
+        'parent': parent_memory,
+        'workers': worker_memory,
+    }
+
+
+def main():
+    n_workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    results = {}
+    for label, engine, preload_in_parent in SCENARIOS:
+        env = dict(os.environ, ATTRITION_ENGINE=engine, ATTRITION_CACHE_SIZE='0', PYTHONWARNINGS='ignore')
+        output = subprocess.run([sys.executable, __file__, '--child', str(n_workers), str(int(preload_in_parent))],
+                                env=env, capture_output=True, text=True, check=True).stdout
+        results[label] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"\n--- Start-up and memory with {n_workers} forked workers (memory in MB) ---")
+    print(f"{'scenario':<26}{'cold start ms':>15}{'worker RSS':>12}{'worker private':>16}{'worker PSS':>12}{'total PSS':>11}")
+    for label, result in results.items():
+        workers = result['workers']
+        mean = lambda key: sum(w[key] for w in workers) / len(workers) / 1024
+        total_pss = (result['parent']['pss_kb'] + sum(w['pss_kb'] for w in workers)) / 1024
+        print(f"{label:<26}{result['cold_start_ms']:>15.1f}{mean('rss_kb'):>12.1f}{mean('private_kb'):>16.1f}"
+              f"{mean('pss_kb'):>12.1f}{total_pss:>11.1f}")
+    return results
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        import contextlib
+        with contextlib.redirect_stdout(sys.stderr): # keep app.py's log lines out of the JSON result
+            result = measure_engine(int(sys.argv[2]), sys.argv[3] == '1')
+        print(json.dumps(result))
+    else:
+        main()
@@ -0,0 +1,68 @@
+# bulk_score.py
+# Command-line bulk scorer: scores a whole CSV or NDJSON file of employees (shaped like employee_data.csv)
+# with the saved model, reading and writing it in fixed-size chunks so memory stays flat for huge files.
+#
+# Usage:
+#   python bulk_score.py employee_data.csv -o scores.ndjson
+#   python bulk_score.py employees.jsonl -o scores.csv --chunk-rows 20000
+
+import argparse
+import pickle
+import sys
+from feature_schema import FeatureSchema, FEATURE_SCHEMA_FILE
+from scoring import score_matrix, detect_format, iter_record_chunks, iter_scored_chunks, DEFAULT_CHUNK_ROWS
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV or NDJSON file of employees in chunks.")
+    parser.add_argument('input', help="Input file (.csv, or .jsonl/.ndjson for newline-delimited JSON). Use '-' for stdin.")
+    parser.add_argument('-o', '--output', default='-', help="Output file (default: stdout).")
+    parser.add_argument('--input-format', choices=['csv', 'ndjson'], help="Override the input format detected from the file name.")
+    parser.add_argument('--output-format', choices=['csv', 'ndjson'], help="Override the output format detected from the file name.")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS, help=f"Rows scored per chunk (default: {DEFAULT_CHUNK_ROWS}).")
+    parser.add_argument('--model', default='model.pkl', help="Path to the saved model (default: model.pkl).")
+    parser.add_argument('--scaler', default='scaler.pkl', help="Path to the saved scaler (default: scaler.pkl).")
+    parser.add_argument('--schema', default=FEATURE_SCHEMA_FILE, help=f"Path to the saved feature schema (default: {FEATURE_SCHEMA_FILE}).")
+    args = parser.parse_args(argv)
+
+    # --- Load Saved Model, Scaler and Feature Schema ---
+    try:
+        with open(args.model, 'rb') as f:
+            model = pickle.load(f)
+        with open(args.scaler, 'rb') as f:
+            scaler = pickle.load(f)
+        schema = FeatureSchema.load(args.schema)
+    except FileNotFoundError as e:
+        print(f"Error: {e.filename} not found. Please run 'model_dev.py' first.", file=sys.stderr)
+        return 1
+
+    input_format = args.input_format or detect_format(args.input)
+    output_format = args.output_format or detect_format(args.output, default='ndjson')
+    source = sys.stdin if args.input == '-' else args.input
+
+    # --- Score chunk by chunk, writing each block of results as soon as it is ready ---
+    # The first chunk is scored before the output is opened, so an unreadable input leaves no empty output file
+    try:
+        chunks = iter_record_chunks(source, input_format, args.chunk_rows)
+        scored_chunks = iter_scored_chunks(chunks, lambda input_array: score_matrix(model, scaler, input_array), output_format, schema=schema)
+        first_block = next(scored_chunks, '')
+    except (OSError, ValueError) as e:
+        # pandas' EmptyDataError / ParserError and missing columns are ValueErrors
+        print(f"Error: could not read '{args.input}': {e}", file=sys.stderr)
+        return 1
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    try:
+        out.write(first_block)
+        for block in scored_chunks:
+            out.write(block)
+    except ValueError as e:
+        print(f"Error: could not read '{args.input}': {e}", file=sys.stderr)
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
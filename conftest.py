@@ -0,0 +1,10 @@
+# conftest.py
+# test_api.py is a manual smoke test that posts to a running server (python app.py) as soon as it is
+# imported, so it is not collected by pytest.
+collect_ignore = ['test_api.py']
+
+import os
+
+# No background hot-reload thread unless a test starts one itself: a watcher left running from one test
+# would poll whatever registry a later test points app.py at and swap versions behind its back.
+os.environ.setdefault('ATTRITION_RELOAD_INTERVAL', '0')
@@ -0,0 +1,191 @@
+# feature_schema.py
+# The feature schema saved with every model (feature_schema.json): the column order the scaler and model
+# were fitted on, each column's dtype, and the category -> code table of every text column.
+# model_dev.py writes it while training; app.py, asgi_app.py and the bulk scorer load it and use it to
+# turn incoming records into model rows. Clients can therefore send raw values ("Travel_Rarely") as
+# well as the numeric codes (2). A numeric code must be a whole number in range(number of categories);
+# unknown names and codes are rejected with the list of valid values.
+#
+# Encoding never builds a pandas DataFrame for API requests:
+# - encode_record(): one record, one dict lookup per categorical feature.
+# - encode_records(): a batch of records, converted column by column; text categories are looked up for
+#   the whole column at once with np.searchsorted over the sorted category names.
+# - encode_frame(): the same column-wise lookup for DataFrame chunks (bulk file scoring).
+
+import json
+import os
+import numpy as np
+import pandas as pd
+
+FEATURE_SCHEMA_FILE = 'feature_schema.json'
+SCHEMA_FORMAT_VERSION = 1
+
+
+class FeatureSchema:
+    def __init__(self, feature_order, categories, dtypes=None, target=None):
+        self.feature_order = list(feature_order)
+        self.categories = {column: list(levels) for column, levels in categories.items()} # levels in code order
+        self.dtypes = dict(dtypes or {})
+        self.target = dict(target or {})
+        self.n_features = len(self.feature_order)
+        # level -> code, for single records
+        self._codes = {column: {level: float(code) for code, level in enumerate(levels)}
+                       for column, levels in self.categories.items()}
+        # sorted level names + their codes, for looking up a whole column at once
+        self._lookup = {}
+        for column, levels in self.categories.items():
+            order = np.argsort(np.array(levels, dtype=str), kind='stable')
+            self._lookup[column] = (np.array(levels, dtype=str)[order], order.astype(np.float64))
+
+    # --- Creating, saving and loading ---
+    @classmethod
+    def from_training_frame(cls, X, encodings, target_column=None):
+        # X: the encoded training features (column order = fit order); encodings: {column: levels in code order}
+        categories = {column: levels for column, levels in encodings.items() if column in X.columns}
+        dtypes = {column: 'category' if column in categories else str(X[column].dtype) for column in X.columns}
+        target = {'column': target_column, 'classes': encodings.get(target_column)} if target_column else None
+        return cls(X.columns, categories, dtypes, target)
+
+    def to_dict(self):
+        return {
+            'format_version': SCHEMA_FORMAT_VERSION,
+            'feature_order': self.feature_order,
+            'dtypes': self.dtypes,
+            'categories': self.categories,
+            'target': self.target
+        }
+
+    def save(self, path=FEATURE_SCHEMA_FILE):
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path=FEATURE_SCHEMA_FILE):
+        with open(path) as f:
+            schema = json.load(f)
+        if schema.get('format_version') != SCHEMA_FORMAT_VERSION:
+            raise ValueError(f"Unsupported feature schema format version {schema.get('format_version')} in '{path}'.")
+        return cls(schema['feature_order'], schema['categories'], schema.get('dtypes'), schema.get('target'))
+
+    # --- Single values and records ---
+    def _invalid(self, feature, value):
+        if feature in self.categories:
+            return ValueError(f"Invalid value for '{feature}': {value!r}. Expected one of "
+                              f"{', '.join(self.categories[feature])} (or its numeric code).")
+        return ValueError(f"Invalid value for '{feature}': {value!r}. All features must be numerical.")
+
+    def is_code(self, feature, number):
+        # Whether a float is a valid code of a categorical feature
+        return number.is_integer() and 0 <= number < len(self.categories[feature])
+
+    def valid_codes(self, feature, numbers):
+        # The same check for a whole float array (NaN is never valid)
+        return (numbers == np.floor(numbers)) & (numbers >= 0) & (numbers < len(self.categories[feature]))
+
+    def encode_value(self, feature, value):
+        # Category name -> code; numbers (or numbers sent as text) pass through as floats
+        codes = self._codes.get(feature)
+        if codes is not None and isinstance(value, str) and value in codes:
+            return codes[value]
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise self._invalid(feature, value) from None
+        if codes is not None and not self.is_code(feature, number):
+            raise self._invalid(feature, value)
+        return number
+
+    def encode_record(self, record):
+        # One record (dict) -> 1-row float64 matrix in feature_order.
+        # Raises KeyError for a missing feature and ValueError for a value that can't be encoded.
+        input_array = np.empty((1, self.n_features), dtype=np.float64)
+        row = input_array[0]
+        for j, feature in enumerate(self.feature_order):
+            row[j] = self.encode_value(feature, record[feature])
+        return input_array
+
+    # --- Batches ---
+    def encode_category_column(self, feature, values):
+        # Vectorized lookup of category names; anything else is parsed as a numeric code
+        # (NaN if it isn't a valid one)
+        levels, codes = self._lookup[feature]
+        # Each value is turned into text on its own: np.asarray() would turn list values into extra dimensions
+        names = np.array([str(value) for value in values], dtype=str)
+        positions = np.minimum(np.searchsorted(levels, names), len(levels) - 1)
+        found = levels[positions] == names
+        encoded = np.where(found, codes[positions], np.nan)
+        if not found.all():
+            unmatched = np.flatnonzero(~found)
+            numbers = np.array([_to_float(values[k]) for k in unmatched], dtype=np.float64)
+            numbers[~self.valid_codes(feature, numbers)] = np.nan
+            encoded[unmatched] = numbers
+        return encoded
+
+    def encode_records(self, records):
+        # A list of records -> (matrix, valid_rows, row_errors). Each column is converted with one NumPy call;
+        # records with a missing or invalid value get a per-row error instead of failing the whole batch.
+        feature_matrix = np.full((len(records), self.n_features), np.nan)
+        row_errors = {i: 'Invalid record format. Expected a JSON object (dictionary).'
+                      for i, record in enumerate(records) if not isinstance(record, dict)}
+        rows = [i for i, record in enumerate(records) if isinstance(record, dict)]
+        missing = object()
+        for j, feature in enumerate(self.feature_order):
+            values = [records[i].get(feature, missing) for i in rows]
+            if any(value is missing for value in values):
+                for i, value in zip(rows, values):
+                    if value is missing:
+                        row_errors.setdefault(i, f"Missing input feature: '{feature}'. Please provide all expected features.")
+                values = [0.0 if value is missing else value for value in values]
+            if feature in self.categories:
+                column = self.encode_category_column(feature, values)
+            else:
+                try:
+                    column = np.array(values, dtype=np.float64)
+                except (TypeError, ValueError):
+                    column = np.array([_to_float(value) for value in values], dtype=np.float64)
+            for k in np.flatnonzero(~np.isfinite(column)):
+                if feature not in self.categories and _is_number(values[k]):
+                    message = "Invalid feature value: NaN or infinity. All features must be finite numbers."
+                else:
+                    message = f"Invalid feature value: {self._invalid(feature, values[k])}"
+                row_errors.setdefault(rows[k], message)
+            feature_matrix[rows, j] = column
+        valid_rows = np.ones(len(records), dtype=bool)
+        valid_rows[list(row_errors)] = False
+        return feature_matrix, valid_rows, row_errors
+
+    def encode_frame(self, df):
+        # A DataFrame chunk (e.g. from a CSV shaped like employee_data.csv) -> (matrix, valid_rows).
+        # Categorical columns may hold either the raw text ("Travel_Rarely") or the numeric code (2).
+        missing = [column for column in self.feature_order if column not in df.columns]
+        if missing:
+            raise ValueError(f"Input is missing required columns: {', '.join(missing)}")
+        feature_matrix = np.empty((len(df), self.n_features), dtype=np.float64)
+        for j, column in enumerate(self.feature_order):
+            values = df[column]
+            if pd.api.types.is_numeric_dtype(values):
+                feature_matrix[:, j] = values.to_numpy(dtype=np.float64, na_value=np.nan)
+                if column in self.categories:
+                    feature_matrix[~self.valid_codes(column, feature_matrix[:, j]), j] = np.nan
+            elif column in self.categories:
+                feature_matrix[:, j] = self.encode_category_column(column, values.to_numpy(dtype=object))
+            else:
+                feature_matrix[:, j] = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        valid_rows = np.isfinite(feature_matrix).all(axis=1)
+        return feature_matrix, valid_rows
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+def _is_number(value):
+    # True for anything float() accepts, including NaN and infinity
+    try:
+        float(value)
+        return True
+    except (TypeError, ValueError):
+        return False
@@ -0,0 +1,375 @@
+# forest_engine.py
+# Flat-array inference engine for the saved RandomForestClassifier.
+# export: all trees of the forest are flattened into a few contiguous NumPy arrays
+#         (split feature, threshold, left/right child and per-node class values).
+# predict: FlatForest walks every tree for a whole batch of rows at once with vectorized NumPy indexing,
+#          skipping sklearn's per-call validation and per-estimator Python dispatch.
+# The arithmetic mirrors sklearn exactly (float32 inputs, per-tree leaf values summed tree by tree,
+# then divided by the number of trees), so predict_proba is bit-identical to model.predict_proba.
+#
+# fold_scaler() additionally folds the StandardScaler into the thresholds, so a fused export can be fed raw rows.
+# prune_depth(), select_trees(), compact_arrays() and quantize_thresholds() build smaller variants of a forest
+# (see the compression stage in training_pipeline.py).
+#
+# Artifact format: a directory with one plain .npy file per node array plus a small manifest.json.
+# Child indices are stored once, interleaved ([left, right] per node); the left / right arrays are
+# strided views of it made at load time.
+# Loading memory-maps the .npy files read-only instead of unpickling, so start-up is nearly instant and
+# every worker process on the machine shares the same physical pages of the forest.
+#
+# Usage (export an existing model and scaler without retraining):
+#   python forest_engine.py model.pkl scaler.pkl
+
+import json
+import os
+import pickle
+import sys
+import numpy as np
+
+FLAT_FOREST_DIR = 'model_flat'
+# Flattened forest with the StandardScaler folded into its thresholds ("fused preprocessing").
+FUSED_FOREST_DIR = 'model_fused'
+# Smaller variants of the flattened forest, one directory each (built by training_pipeline.build_model_variants).
+MODEL_VARIANTS_DIR = 'model_variants'
+MANIFEST_FILE = 'manifest.json'
+# 1: children_left / children_right saved next to children; 2: the same plus quantized thresholds;
+# 3: only the interleaved children array (left / right are derived when loading). Versions 1-3 are read.
+ARTIFACT_FORMAT_VERSION = 3
+READABLE_FORMAT_VERSIONS = (1, 2, 3)
+
+# Per-node arrays stored as .npy files; everything else lives in the manifest.
+NODE_ARRAYS = ['feature', 'threshold', 'children', 'missing_go_to_left', 'value', 'roots']
+# Written by format versions 1 and 2 only; removed when a directory is overwritten with the current format.
+LEGACY_ARRAYS = ['children_left', 'children_right']
+# Extra arrays of a quantized forest: every feature's sorted split thresholds, and where each feature's start.
+QUANTIZED_ARRAYS = ['bin_edges', 'bin_starts']
+
+# Rows are traversed in blocks of this size to bound the (n_trees x rows) working arrays.
+TRAVERSAL_BLOCK_ROWS = 4096
+
+
+def flatten_forest(model):
+    # Concatenate the nodes of every tree into one set of arrays.
+    # Child indices are made global (offset by where each tree starts), and leaves point to themselves,
+    # so a row that reaches a leaf early simply stays there while deeper rows keep walking.
+    features, thresholds, lefts, rights, missing_lefts, values, roots = [], [], [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        node_ids = np.arange(tree.node_count, dtype=np.intp)
+        is_leaf = tree.children_left == -1
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+        thresholds.append(tree.threshold.astype(np.float64))
+        lefts.append(np.where(is_leaf, node_ids, tree.children_left).astype(np.intp) + offset)
+        rights.append(np.where(is_leaf, node_ids, tree.children_right).astype(np.intp) + offset)
+        missing_lefts.append(tree.missing_go_to_left.astype(bool))
+        # Same values sklearn's DecisionTreeClassifier.predict_proba returns for a leaf
+        values.append(tree.value[:, 0, :model.n_classes_].astype(np.float64))
+        roots.append(offset)
+        offset += tree.node_count
+
+    children_left, children_right = np.concatenate(lefts), np.concatenate(rights)
+    return {
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'children_left': children_left,
+        'children_right': children_right,
+        # Left and right child side by side: the next node is children[2 * node + went_right]
+        'children': np.column_stack([children_left, children_right]).ravel(),
+        'missing_go_to_left': np.concatenate(missing_lefts),
+        'value': np.concatenate(values),
+        'roots': np.array(roots, dtype=np.intp),
+        'classes': np.asarray(model.classes_),
+        'n_features': np.array(model.n_features_in_, dtype=np.intp),
+        'max_depth': np.array(max(estimator.tree_.max_depth for estimator in model.estimators_), dtype=np.intp),
+    }
+
+
+def _float_to_key(x):
+    # Map float64 values to int64 keys with the same ordering (for bisecting over representable floats)
+    bits = x.view(np.int64)
+    return np.where(bits < 0, -(bits & np.int64(0x7FFFFFFFFFFFFFFF)), bits)
+
+
+def _key_to_float(key):
+    bits = np.where(key < 0, (-key) | np.int64(-0x8000000000000000), key)
+    return bits.view(np.float64)
+
+
+def fold_scaler(arrays, scaler):
+    # Fold a fitted StandardScaler into the split thresholds, so the forest can be fed raw (unscaled) rows.
+    # sklearn sends a raw value x left when float32((x - mean) / scale) <= threshold. That test is monotone
+    # in x, so it is equivalent to x <= t' for one boundary value t'. Instead of the approximate
+    # t' = threshold * scale + mean, we bisect over float64 values for the exact boundary, which keeps
+    # predictions bit-identical to scaler.transform() followed by model.predict_proba().
+    fused = dict(arrays)
+    internal = arrays['children_left'] != np.arange(len(arrays['feature']))
+    feature = arrays['feature'][internal]
+    threshold = arrays['threshold'][internal]
+    mean = np.asarray(scaler.mean_, dtype=np.float64)[feature] if scaler.with_mean else np.zeros(len(feature))
+    scale = np.asarray(scaler.scale_, dtype=np.float64)[feature] if scaler.with_std else np.ones(len(feature))
+
+    def goes_left(x):
+        return ((x - mean) / scale).astype(np.float32) <= threshold
+
+    # Bracket the boundary around the approximate value, widening until lo goes left and hi doesn't
+    approx = threshold * scale + mean
+    width = 1e-6 * (np.abs(approx) + np.abs(mean) + scale) + 1e-300
+    while True:
+        lo, hi = approx - width, approx + width
+        if goes_left(lo).all() and not goes_left(hi).any():
+            break
+        width *= 16
+    lo_key, hi_key = _float_to_key(lo), _float_to_key(hi)
+    while (hi_key - lo_key > 1).any():
+        mid_key = lo_key + (hi_key - lo_key) // 2
+        left = goes_left(_key_to_float(mid_key))
+        lo_key = np.where(left, mid_key, lo_key)
+        hi_key = np.where(left, hi_key, mid_key)
+
+    fused['threshold'] = arrays['threshold'].copy()
+    fused['threshold'][internal] = _key_to_float(lo_key)
+    # Raw inputs are compared as float64 (the scaler, not a float32 cast, came first in sklearn's path)
+    fused['input_dtype'] = np.array('float64')
+    return fused
+
+
+
+# --- Smaller variants of a flattened forest ---
+def _node_depths(arrays):
+    # Depth of every node (roots are 0), found one level at a time across all trees
+    children_left, children_right = arrays['children_left'], arrays['children_right']
+    internal = children_left != np.arange(len(children_left))
+    depth = np.zeros(len(children_left), dtype=np.intp)
+    frontier, level = np.asarray(arrays['roots']), 0
+    while frontier.size:
+        depth[frontier] = level
+        frontier = frontier[internal[frontier]]
+        frontier = np.concatenate([children_left[frontier], children_right[frontier]])
+        level += 1
+    return depth
+
+def _keep_nodes(arrays, keep, new_leaves=None):
+    # Copy of the arrays with only the nodes where `keep` is True, child and root indices renumbered.
+    # Nodes in the boolean mask new_leaves become leaves and predict their own (training) value.
+    node_ids = np.arange(len(keep))
+    children_left, children_right = arrays['children_left'].copy(), arrays['children_right'].copy()
+    feature = arrays['feature'].copy()
+    if new_leaves is not None:
+        children_left[new_leaves] = children_right[new_leaves] = node_ids[new_leaves]
+        feature[new_leaves] = 0
+    new_index = np.cumsum(keep) - 1
+    kept = np.flatnonzero(keep)
+    result = dict(arrays)
+    result['feature'] = feature[kept]
+    result['threshold'] = arrays['threshold'][kept]
+    result['children_left'] = new_index[children_left[kept]].astype(children_left.dtype)
+    result['children_right'] = new_index[children_right[kept]].astype(children_right.dtype)
+    result['children'] = np.column_stack([result['children_left'], result['children_right']]).ravel()
+    result['missing_go_to_left'] = arrays['missing_go_to_left'][kept]
+    result['value'] = arrays['value'][kept]
+    roots = np.asarray(arrays['roots'])
+    result['roots'] = new_index[roots[keep[roots]]].astype(roots.dtype)
+    result['max_depth'] = np.array(_node_depths(result).max(), dtype=np.intp)
+    return result
+
+def prune_depth(arrays, max_depth):
+    # Cut every tree at max_depth: nodes at that depth become leaves and everything below them is dropped.
+    depth = _node_depths(arrays)
+    internal = arrays['children_left'] != np.arange(len(depth))
+    return _keep_nodes(arrays, depth <= max_depth, new_leaves=internal & (depth == max_depth))
+
+def select_trees(arrays, tree_indices):
+    # A forest made of only the given trees (kept in their original order)
+    roots = np.asarray(arrays['roots'])
+    tree_ends = np.append(roots[1:], len(arrays['feature']))
+    keep = np.zeros(len(arrays['feature']), dtype=bool)
+    for tree in sorted(set(tree_indices)):
+        keep[roots[tree]:tree_ends[tree]] = True
+    return _keep_nodes(arrays, keep)
+
+def _smallest_int(n):
+    return next(dtype for dtype in (np.int8, np.int16, np.int32, np.int64) if n <= np.iinfo(dtype).max)
+
+def compact_arrays(arrays):
+    # Smallest dtypes that still give the same leaves: int32 node indices, int8 features and float32
+    # thresholds. A float32 input x satisfies x <= t exactly when x <= t rounded *down* to float32, so
+    # rounding the thresholds that way changes no split. Leaf values become float32 as well, so the
+    # probabilities move by up to ~1e-7.
+    if np.dtype(str(arrays.get('input_dtype', 'float32'))) != np.float32:
+        raise ValueError("Only forests fed float32 inputs (not fused exports) can have float32 thresholds.")
+    threshold = arrays['threshold'].astype(np.float32)
+    rounded_up = threshold.astype(np.float64) > arrays['threshold']
+    threshold[rounded_up] = np.nextafter(threshold[rounded_up], np.float32(-np.inf))
+    index_dtype = np.int32 if 2 * len(arrays['feature']) < np.iinfo(np.int32).max else np.int64
+    compact = dict(arrays)
+    compact['threshold'] = threshold
+    compact['feature'] = arrays['feature'].astype(_smallest_int(int(arrays['n_features'])))
+    for name in ('children_left', 'children_right', 'children', 'roots'):
+        compact[name] = arrays[name].astype(index_dtype)
+    compact['value'] = arrays['value'].astype(np.float32)
+    return compact
+
+def quantize_thresholds(arrays):
+    # Replace every threshold by its position among the sorted distinct thresholds of its feature (int16),
+    # and store those sorted thresholds as bin edges. At predict time each input value is turned into the
+    # number of edges below it (np.searchsorted); x <= edges[k] exactly when that number is <= k,
+    # so the quantized forest reaches exactly the same leaves.
+    n_features = int(arrays['n_features'])
+    internal = arrays['children_left'] != np.arange(len(arrays['feature']))
+    feature, threshold = arrays['feature'][internal], arrays['threshold'][internal]
+    edges, starts = [], [0]
+    bin_index = np.zeros(len(arrays['feature']), dtype=np.int64)
+    positions = np.zeros(len(feature), dtype=np.int64)
+    for j in range(n_features):
+        in_feature = feature == j
+        feature_edges, inverse = np.unique(threshold[in_feature], return_inverse=True)
+        positions[in_feature] = inverse
+        edges.append(feature_edges)
+        starts.append(starts[-1] + len(feature_edges))
+    bin_index[internal] = positions
+    quantized = dict(arrays)
+    quantized['threshold'] = bin_index.astype(_smallest_int(max(len(e) for e in edges) + 1))
+    quantized['bin_edges'] = np.concatenate(edges).astype(arrays['threshold'].dtype)
+    quantized['bin_starts'] = np.array(starts, dtype=np.int32)
+    return quantized
+
+
+def save_flat_forest(arrays, directory=FLAT_FOREST_DIR):
+    # Every file is written under a temporary name and then renamed into place. Workers that still have
+    # the old files memory-mapped keep reading the old (unlinked) data instead of crashing on a truncated file.
+    os.makedirs(directory, exist_ok=True)
+    names = NODE_ARRAYS + [name for name in QUANTIZED_ARRAYS if name in arrays]
+    for name in names:
+        path = os.path.join(directory, f"{name}.npy")
+        np.save(path + '.tmp.npy', np.ascontiguousarray(arrays[name]))
+        os.replace(path + '.tmp.npy', path)
+    manifest = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'n_trees': int(len(arrays['roots'])),
+        'n_nodes': int(len(arrays['feature'])),
+        'n_features': int(arrays['n_features']),
+        'max_depth': int(arrays['max_depth']),
+        'classes': np.asarray(arrays['classes']).tolist(),
+        'input_dtype': str(arrays.get('input_dtype', 'float32')),
+        'arrays': names
+    }
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    # Only after the new manifest is in place: files an older export of this directory wrote and this one doesn't
+    for name in LEGACY_ARRAYS + QUANTIZED_ARRAYS:
+        path = os.path.join(directory, f"{name}.npy")
+        if name not in names and os.path.exists(path):
+            os.remove(path)
+
+
+class FlatForest:
+    # Lightweight drop-in for the fitted RandomForestClassifier at prediction time:
+    # offers predict_proba(), predict() and classes_, so the serving code can use either one.
+
+    def __init__(self, arrays):
+        self.feature = arrays['feature']
+        # Compact exports store small integer types on disk; gathers need intp, so convert those once here
+        self.feature_index = self.feature.astype(np.intp, copy=False)
+        self.threshold = arrays['threshold']
+        self.children = arrays['children']
+        self.children_left = self.children[0::2]
+        self.children_right = self.children[1::2]
+        self.missing_go_to_left = arrays['missing_go_to_left']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.classes_ = arrays['classes']
+        self.n_features_in_ = int(arrays['n_features'])
+        self.max_depth = int(arrays['max_depth'])
+        # Plain exports compare float32 inputs like sklearn; fused exports compare raw float64 inputs
+        self.input_dtype = np.dtype(str(arrays['input_dtype'])) if 'input_dtype' in arrays else np.dtype(np.float32)
+        # Quantized exports: thresholds are bin numbers, and inputs are binned with these edges first
+        self.bin_edges = arrays.get('bin_edges')
+        self.bin_starts = arrays.get('bin_starts')
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(flatten_forest(model))
+
+    @classmethod
+    def load(cls, directory=FLAT_FOREST_DIR, mmap=True):
+        # With mmap=True the node arrays are mapped read-only from disk rather than copied into this process.
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') not in READABLE_FORMAT_VERSIONS:
+            raise ValueError(f"Unsupported flat forest format version {manifest.get('format_version')} in '{directory}'.")
+        arrays = {name: np.asarray(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r' if mmap else None))
+                  for name in manifest['arrays'] if name not in LEGACY_ARRAYS}
+        arrays['classes'] = np.array(manifest['classes'])
+        arrays['n_features'] = manifest['n_features']
+        arrays['max_depth'] = manifest['max_depth']
+        arrays['input_dtype'] = manifest['input_dtype']
+        return cls(arrays)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def quantize(self, X):
+        # Bin number of every value: how many of its feature's split thresholds lie below it
+        bins = np.empty(X.shape, dtype=self.threshold.dtype)
+        for j in range(self.n_features_in_):
+            bins[:, j] = np.searchsorted(self.bin_edges[self.bin_starts[j]:self.bin_starts[j + 1]], X[:, j])
+        return bins
+
+    def apply(self, X):
+        # Leaf index (into the flat node arrays) reached by every row in every tree: shape (n_trees, n_rows).
+        # Like sklearn, thresholds are compared against the input cast to float32 (float64 for fused exports).
+        X = np.asarray(X, dtype=self.input_dtype)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}, but the forest expects {self.n_features_in_} features per row.")
+        n_rows = X.shape[0]
+        check_missing = bool(np.isnan(X).any())
+        # Feature-major flat copy of X, so each step is a single 1-D gather: X_flat[feature * n_rows + row]
+        X_flat = (self.quantize(X) if self.bin_edges is not None else X).T.ravel()
+        missing_flat = np.isnan(X).T.ravel() if check_missing else None
+        feature_offset = self.feature_index * n_rows
+        rows = np.tile(np.arange(n_rows), self.n_trees)
+        node = np.repeat(self.roots.astype(np.intp, copy=False), n_rows)
+        for _ in range(self.max_depth):
+            index = feature_offset[node] + rows
+            go_right = ~(X_flat[index] <= self.threshold[node])
+            if check_missing:
+                go_right = np.where(missing_flat[index], ~self.missing_go_to_left[node], go_right)
+            node = self.children[2 * node + go_right].astype(np.intp, copy=False)
+        node = node.reshape(self.n_trees, n_rows)
+        return node
+
+    def predict_proba(self, X):
+        X = np.asarray(X)
+        proba = np.zeros((X.shape[0], len(self.classes_)), dtype=np.float64)
+        for start in range(0, X.shape[0], TRAVERSAL_BLOCK_ROWS):
+            leaves = self.apply(X[start:start + TRAVERSAL_BLOCK_ROWS])
+            block = proba[start:start + TRAVERSAL_BLOCK_ROWS]
+            if self.value.dtype == np.float64:
+                # Add the trees one at a time, in order, exactly like sklearn accumulates them
+                for tree_leaves in leaves:
+                    block += self.value[tree_leaves]
+            else:
+                # float32 leaf values (compact exports) already differ from sklearn in the last bits: sum in one call
+                block += self.value[leaves].sum(axis=0, dtype=np.float64)
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
+
+
+if __name__ == '__main__':
+    model_path = sys.argv[1] if len(sys.argv) > 1 else 'model.pkl'
+    scaler_path = sys.argv[2] if len(sys.argv) > 2 else 'scaler.pkl'
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    with open(scaler_path, 'rb') as f:
+        scaler = pickle.load(f)
+    arrays = flatten_forest(model)
+    save_flat_forest(arrays, FLAT_FOREST_DIR)
+    save_flat_forest(fold_scaler(arrays, scaler), FUSED_FOREST_DIR)
+    print(f"Flattened {len(model.estimators_)} trees from '{model_path}' into '{FLAT_FOREST_DIR}/' and '{FUSED_FOREST_DIR}/'.")
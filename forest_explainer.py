@@ -0,0 +1,88 @@
+# forest_explainer.py
+# Per-feature explanations of the forest's attrition probability (used by app.py's /explain).
+# Path decomposition (Saabas): in every tree, each split a row passes through moves the node value
+# (the share of "Yes" attrition) from the parent's value to the child's value; that change is credited
+# to the split feature. Summed along the path and averaged over all trees:
+#     probability_yes = bias + sum(contributions)
+# where bias is the average root value (the training base rate) and contributions has one entry per feature.
+#
+# The path sum of every leaf only depends on the tree, not on the row, so it is computed once when the
+# model is loaded: a (n_leaves x n_features) table. Explaining rows is then one traversal of the forest
+# (the same FlatForest.apply() that predict_proba uses) plus one table row gathered and added per tree.
+# The probabilities come out of the same pass and are bit-identical to model.predict_proba.
+#
+# Cost (100-tree model, 1 CPU): the table holds n_leaves x n_features float64 values, about 3.4 MB
+# (14k leaves x 30 features), and takes ~15 ms to build. explain() costs about 1.6x the same forest's
+# FlatForest.predict_proba for one row (0.47 vs 0.29 ms) and 1.2-1.3x for batches of 256+ rows.
+# With the default sklearn engine, /explain is therefore cheaper than /predict for small batches
+# (0.5 vs 2.8 ms for one row) and ~2x for a batch of 1,470 rows. Perturbing each of the 30 features
+# and rescoring would cost ~30x a prediction instead.
+
+import numpy as np
+from forest_engine import FlatForest, TRAVERSAL_BLOCK_ROWS
+
+# Column of the forest's class values that is explained: class 1, "Yes" attrition.
+EXPLAINED_CLASS = 1
+
+
+def path_contributions(forest, class_index=EXPLAINED_CLASS):
+    # For every leaf of a FlatForest, the per-feature sum of value changes along the path from the root.
+    # Returns (bias per tree, table of shape (n_leaves, n_features), node index -> table row (-1 for internal nodes)).
+    n_nodes = len(forest.feature)
+    node_ids = np.arange(n_nodes)
+    is_leaf = np.asarray(forest.children_left) == node_ids
+    value = np.asarray(forest.value[:, class_index], dtype=np.float64)
+    feature = np.asarray(forest.feature)
+    children_left, children_right = np.asarray(forest.children_left), np.asarray(forest.children_right)
+
+    # Walk all trees one depth level at a time; each child starts from its parent's sums
+    contributions = np.zeros((n_nodes, forest.n_features_in_), dtype=np.float64)
+    frontier = np.asarray(forest.roots)
+    while frontier.size:
+        frontier = frontier[~is_leaf[frontier]]
+        children = []
+        for child in (children_left[frontier], children_right[frontier]):
+            contributions[child] = contributions[frontier]
+            contributions[child, feature[frontier]] += value[child] - value[frontier]
+            children.append(child)
+        frontier = np.concatenate(children)
+
+    leaves = np.flatnonzero(is_leaf)
+    leaf_row = np.full(n_nodes, -1, dtype=np.intp)
+    leaf_row[leaves] = np.arange(len(leaves))
+    return value[np.asarray(forest.roots)], contributions[leaves], leaf_row
+
+
+class ForestExplainer:
+    # Built once per loaded model. explain() takes rows exactly as the forest is fed them
+    # (scaled for the sklearn / flat engines, raw for the fused engine).
+
+    def __init__(self, forest, class_index=EXPLAINED_CLASS):
+        self.forest = forest
+        self.class_index = class_index
+        tree_bias, self.leaf_contributions, self.leaf_row = path_contributions(forest, class_index)
+        self.bias = float(tree_bias.mean())
+
+    @classmethod
+    def from_model(cls, model, class_index=EXPLAINED_CLASS):
+        # Works with a FlatForest or a fitted RandomForestClassifier (flattened here, once)
+        forest = model if isinstance(model, FlatForest) else FlatForest.from_model(model)
+        return cls(forest, class_index)
+
+    def explain(self, X):
+        # Returns (predict_proba of every row, per-feature contributions of shape (n_rows, n_features)).
+        # For each row: proba[:, class_index] == bias + contributions.sum(axis=1), up to float rounding.
+        forest = self.forest
+        X = np.asarray(X)
+        proba = np.zeros((X.shape[0], len(forest.classes_)), dtype=np.float64)
+        contributions = np.zeros((X.shape[0], forest.n_features_in_), dtype=np.float64)
+        for start in range(0, X.shape[0], TRAVERSAL_BLOCK_ROWS):
+            leaves = forest.apply(X[start:start + TRAVERSAL_BLOCK_ROWS])
+            block_proba = proba[start:start + TRAVERSAL_BLOCK_ROWS]
+            block_contributions = contributions[start:start + TRAVERSAL_BLOCK_ROWS]
+            for tree_leaves in leaves:
+                block_proba += forest.value[tree_leaves]
+                block_contributions += self.leaf_contributions[self.leaf_row[tree_leaves]]
+        proba /= forest.n_trees
+        contributions /= forest.n_trees
+        return proba, contributions
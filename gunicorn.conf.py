@@ -0,0 +1,22 @@
+# gunicorn.conf.py
+# Production settings for serving app.py with gunicorn (pre-fork workers).
+# Usage:
+#   gunicorn -c gunicorn.conf.py app:app
+#
+# The app is imported once in the parent process and the model is loaded there (preload hook below),
+# so forked workers start ready to serve. With ATTRITION_ENGINE=flat or fused, the forest arrays are
+# memory-mapped read-only files, so every worker shares the same physical pages instead of holding
+# its own unpickled copy.
+
+import os
+
+bind = os.environ.get('ATTRITION_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+threads = int(os.environ.get('ATTRITION_THREADS', 4))
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the parent process before any worker is forked
+    import app
+    app.preload_model()
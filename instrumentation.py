@@ -0,0 +1,242 @@
+# instrumentation.py
+# Built-in metrics for the prediction hot path, exposed in the Prometheus text format (app.py's /metrics).
+# - Counters: requests by endpoint and status, rows scored.
+# - Histograms: request latency per endpoint, and time spent in each stage of the prediction path
+#   (JSON parsing, building the feature row, scaling, forest evaluation, formatting the response, ...).
+# - An opt-in sampling profiler that records the stack of every slow request as folded stacks
+#   ("frame;frame;frame count" lines), ready for flamegraph.pl, speedscope or inferno.
+#
+# Configure with environment variables:
+#   ATTRITION_METRICS=0                 turn metrics off (stage() then returns a shared no-op)
+#   ATTRITION_PROFILE_SLOW_MS=<ms>      turn the profiler on: dump stacks of requests slower than this
+#   ATTRITION_PROFILE_INTERVAL_MS=5     how often the profiler samples request threads
+#   ATTRITION_PROFILE_DIR=profiles      where the .folded files go
+#
+# Metrics live in each process. Under gunicorn every worker has its own; scrape them per worker
+# or compare them as rates.
+
+import bisect
+import collections
+import contextlib
+import os
+import sys
+import threading
+import time
+
+METRICS_ENABLED = os.environ.get('ATTRITION_METRICS', '1') != '0'
+
+# Histogram bucket upper bounds in seconds (a prediction takes from well under 1 ms to a few seconds).
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Keep at most this many profile files; the oldest ones are deleted first.
+MAX_PROFILE_FILES = 200
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = collections.defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *labels):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] += amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0.0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {} # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        if not METRICS_ENABLED:
+            return
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bucket] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    le = bound if bound == '+Inf' else f"{bound:g}"
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames + ('le',), labels + (le,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total:.9g}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = [] # functions returning (name, help, type, {labels}, value) tuples at scrape time
+
+    def counter(self, name, help_text, labelnames=()):
+        metric = Counter(name, help_text, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help_text, labelnames, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        # Everything in the Prometheus text exposition format
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        described = set()
+        for collector in self.collectors:
+            for name, help_text, metric_type, labels, value in collector():
+                if name not in described:
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {metric_type}")
+                    described.add(name)
+                lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {value:g}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+REQUESTS = REGISTRY.counter('attrition_requests_total', 'HTTP requests handled.', ['endpoint', 'status'])
+REQUEST_LATENCY = REGISTRY.histogram('attrition_request_duration_seconds', 'Time to handle a request.', ['endpoint'])
+STAGE_LATENCY = REGISTRY.histogram('attrition_stage_duration_seconds', 'Time spent in each stage of the prediction path.', ['stage'])
+ROWS_SCORED = REGISTRY.counter('attrition_rows_scored_total', 'Employee rows scored.', ['endpoint'])
+
+
+# --- Stage timers ---
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        STAGE_LATENCY.observe(time.perf_counter() - self.start, self.name)
+        return False
+
+_NO_STAGE = contextlib.nullcontext()
+
+def stage(name):
+    # with stage('scale'): ...  -> time the block under attrition_stage_duration_seconds{stage="scale"}
+    return _Stage(name) if METRICS_ENABLED else _NO_STAGE
+
+
+# --- Slow request profiler ---
+def _fold_stack(frame):
+    # "outermost;...;innermost" with one "function (file:line)" entry per frame
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class SlowRequestProfiler:
+    # While a request runs, a background thread samples that request thread's stack every interval_ms.
+    # When the request ends slower than threshold_ms, its samples are written as one .folded file.
+    # Faster requests just drop their samples.
+    def __init__(self, threshold_ms, interval_ms=5.0, output_dir='profiles'):
+        self.threshold = threshold_ms / 1000.0
+        self.interval = interval_ms / 1000.0
+        self.output_dir = output_dir
+        self.profiles_written = 0
+        self._active = {} # thread id -> Counter of folded stacks
+        self._lock = threading.Lock()
+        self._sampler_pid = None
+
+    def begin(self):
+        if self._sampler_pid != os.getpid():
+            self._start_sampler() # first request in this (possibly forked) process
+        with self._lock:
+            self._active[threading.get_ident()] = collections.Counter()
+
+    def end(self, label, duration):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if samples and duration >= self.threshold:
+            self._write(label, duration, samples)
+
+    def _start_sampler(self):
+        with self._lock:
+            if self._sampler_pid == os.getpid():
+                return
+            threading.Thread(target=self._sample_forever, name='slow-request-profiler', daemon=True).start()
+            self._sampler_pid = os.getpid()
+
+    def _sample_forever(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                active = list(self._active.items())
+            for thread_id, samples in active:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    samples[_fold_stack(frame)] += 1
+
+    def _write(self, label, duration, samples):
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_label = ''.join(c if c.isalnum() else '_' for c in label).strip('_') or 'request'
+        path = os.path.join(self.output_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{safe_label}_{duration * 1000:.0f}ms.folded")
+        with open(path, 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        self.profiles_written += 1
+        existing = sorted(os.path.join(self.output_dir, name) for name in os.listdir(self.output_dir) if name.endswith('.folded'))
+        for old in existing[:-MAX_PROFILE_FILES]:
+            with contextlib.suppress(OSError):
+                os.remove(old)
+        print(f"Slow request ({label}, {duration * 1000:.1f} ms): stack samples written to '{path}'.")
+
+
+def profiler_from_env():
+    # The profiler configured by ATTRITION_PROFILE_SLOW_MS, or None when it is off (the default)
+    threshold = os.environ.get('ATTRITION_PROFILE_SLOW_MS')
+    if not threshold:
+        return None
+    return SlowRequestProfiler(float(threshold),
+                               interval_ms=float(os.environ.get('ATTRITION_PROFILE_INTERVAL_MS', 5.0)),
+                               output_dir=os.environ.get('ATTRITION_PROFILE_DIR', 'profiles'))
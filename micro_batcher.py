@@ -0,0 +1,133 @@
+# micro_batcher.py
+# Request coalescing for single-row predictions.
+# Under concurrent load, running the 100-tree forest once per row is dominated by sklearn's per-call
+# overhead. The MicroBatcher queues single rows that arrive within a short window (e.g. 2 ms or 64 rows),
+# scores them together with one call, and hands every caller back its own result.
+# Every row may carry a context (the app passes the model version it read for the request); rows with
+# different contexts are never scored together, so a row is always scored by the model its caller chose.
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+
+# Batch-size histogram buckets reported by stats() (upper bounds, in rows).
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+# How long score() waits for a result by default: the batching window plus this much time for the
+# batches queued ahead of it and for scoring. A caller gets a TimeoutError instead of hanging forever
+# if the worker thread is stuck or gone.
+SCORING_TIMEOUT = 5.0 # seconds
+
+
+class MicroBatcher:
+    def __init__(self, score_fn, max_batch_rows=64, max_wait_ms=2.0, timeout=None):
+        # score_fn(matrix, context) -> (prediction, prediction_proba), called with up to max_batch_rows rows
+        # that share the same context.
+        # A batch is scored as soon as it is full, or max_wait_ms after its first row arrived.
+        # timeout: default seconds score() waits for a result (max_wait + SCORING_TIMEOUT if not given).
+        self.score_fn = score_fn
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self.timeout = timeout if timeout is not None else self.max_wait + SCORING_TIMEOUT
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches_scored = 0
+        self._rows_scored = 0
+        self._max_batch_size = 0
+        self._max_queue_depth = 0
+        self._batch_size_counts = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._worker.start()
+
+    def submit(self, row, context=None):
+        # Queue one feature row and return a Future for its (prediction, probability row).
+        # The row is converted here, in the caller's thread, so one bad row can't fail a shared batch.
+        row = np.asarray(row, dtype=np.float64).reshape(-1)
+        if not self._worker.is_alive():
+            raise RuntimeError('The micro-batcher worker thread is not running.')
+        future = Future()
+        self._queue.put((row, context, future))
+        return future
+
+    def score(self, input_array, context=None, timeout=None):
+        # Drop-in replacement for score_matrix() on a single-row matrix: blocks until the batch is scored,
+        # or raises concurrent.futures.TimeoutError after timeout seconds (default: self.timeout).
+        future = self.submit(input_array, context)
+        raw_prediction, proba_row = future.result(timeout=timeout if timeout is not None else self.timeout)
+        return np.array([raw_prediction]), proba_row[np.newaxis, :]
+
+    def close(self):
+        # Stop the worker thread after it has finished the rows already queued.
+        self._queue.put(None)
+        self._worker.join()
+
+    def stats(self):
+        with self._stats_lock:
+            histogram = {f"le_{bound}": count for bound, count in zip(BATCH_SIZE_BUCKETS, self._batch_size_counts)}
+            histogram['gt_' + str(BATCH_SIZE_BUCKETS[-1])] = self._batch_size_counts[-1]
+            return {
+                'enabled': True,
+                'max_batch_rows': self.max_batch_rows,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self._max_queue_depth,
+                'batches_scored': self._batches_scored,
+                'rows_scored': self._rows_scored,
+                'mean_batch_size': self._rows_scored / self._batches_scored if self._batches_scored else 0.0,
+                'max_batch_size': self._max_batch_size,
+                'batch_size_histogram': histogram
+            }
+
+    # --- Worker thread ---
+    def _collect_batch(self, first_item):
+        # Keep pulling rows until the batch is full or the wait window since the first row has passed.
+        batch = [first_item]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_rows:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Shutdown requested: score what we have, then let _run() see the sentinel again
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            queue_depth = self._queue.qsize() + 1
+            batch = self._collect_batch(item)
+            # Split the batch by context (there is normally just one; two only right around a model swap)
+            groups = {}
+            for row, context, future in batch:
+                groups.setdefault(id(context), (context, [], []))
+                groups[id(context)][1].append(row)
+                groups[id(context)][2].append(future)
+            for context, rows, futures in groups.values():
+                try:
+                    # Stacking is inside the try too: rows of different lengths must not kill the worker
+                    prediction, prediction_proba = self.score_fn(np.vstack(rows), context)
+                except Exception as e:
+                    for future in futures:
+                        future.set_exception(e)
+                else:
+                    for i, future in enumerate(futures):
+                        future.set_result((prediction[i], prediction_proba[i]))
+            self._record_batch(len(batch), queue_depth)
+
+    def _record_batch(self, batch_size, queue_depth):
+        with self._stats_lock:
+            self._batches_scored += 1
+            self._rows_scored += batch_size
+            self._max_batch_size = max(self._max_batch_size, batch_size)
+            self._max_queue_depth = max(self._max_queue_depth, queue_depth)
+            bucket = next((k for k, bound in enumerate(BATCH_SIZE_BUCKETS) if batch_size <= bound), len(BATCH_SIZE_BUCKETS))
+            self._batch_size_counts[bucket] += 1
@@ -1,58 +1,85 @@
 # model_dev.py
 # This script performs data preprocessing, trains an employee attrition prediction model,
 # evaluates it, and saves the trained model and scaler for later use in the API.
-
-import pandas as pd # Library for data manipulation and analysis
+#
+# The parsed + encoded dataset is cached in 'training_cache/' (keyed on the CSV's SHA-256), so re-runs on
+# an unchanged employee_data.csv skip straight to training. Trees are fitted on all CPU cores.
+#
+# Usage:
+#   python model_dev.py                      train, save and publish the model
+#   python model_dev.py --search             also compare forest sizes / depths (time, size, latency, accuracy)
+#   python model_dev.py --no-compress        skip building the smaller model variants (model_variants/)
+#   python model_dev.py --n-estimators 200 --max-depth 12 --n-jobs 4 --no-cache
+
+import argparse # To read the command-line options above
+import json # To save the hyperparameter search report
+import os # To check which artifacts exist before publishing
+import shutil # To remove variants left over from an earlier model
+import time # To time each stage of the pipeline
 from sklearn.model_selection import train_test_split # To split data into training and testing sets
-from sklearn.preprocessing import LabelEncoder, StandardScaler # For data encoding and scaling
+from sklearn.preprocessing import StandardScaler # For data scaling
 from sklearn.ensemble import RandomForestClassifier # The machine learning model we will use
 from sklearn.metrics import accuracy_score # To evaluate model performance
 import pickle # Built-in Python module for serializing (saving) and deserializing (loading) objects
+from scoring import DROP_COLUMNS, TARGET_COLUMN # Column rules shared with the API and bulk scorer
+from forest_engine import flatten_forest, fold_scaler, save_flat_forest, FLAT_FOREST_DIR, FUSED_FOREST_DIR, MODEL_VARIANTS_DIR # Fast flat-array inference engine
+from model_registry import ModelRegistry # Versioned model store the API hot-reloads from
+from feature_schema import FeatureSchema, FEATURE_SCHEMA_FILE # Column order + category codes shared with the API
+from training_pipeline import load_encoded_data, hyperparameter_search, SEARCH_GRID, TRAINING_CACHE_DIR # Cached data stage and parallel search
+from training_pipeline import build_model_variants, save_model_variants, compression_report, COMPRESSION_REPORT_FILE # Smaller model variants
+
+parser = argparse.ArgumentParser(description="Train, evaluate, save and publish the employee attrition model.")
+parser.add_argument('--data', default='employee_data.csv', help="Training CSV (default: employee_data.csv).")
+parser.add_argument('--no-cache', action='store_true', help=f"Re-parse the CSV instead of using '{TRAINING_CACHE_DIR}/'.")
+parser.add_argument('--n-jobs', type=int, default=-1, help="CPU cores used to fit trees (-1 = all cores).")
+parser.add_argument('--n-estimators', type=int, default=100, help="Number of trees (default: 100).")
+parser.add_argument('--max-depth', type=int, default=None, help="Maximum tree depth (default: unlimited).")
+parser.add_argument('--search', action='store_true', help="Also run a parallel search over forest size and depth.")
+parser.add_argument('--no-compress', action='store_true', help=f"Don't build the smaller model variants in '{MODEL_VARIANTS_DIR}/'.")
+args = parser.parse_args()
 
 print("--- Starting Data Preprocessing and Model Training Pipeline ---")
 
 # --- 1. Load Dataset ---
-# This line reads your CSV file into a pandas DataFrame.
-# It expects the file 'employee_data.csv' to be in the same directory as this script.
-print("\nLoading employee_data.csv...")
+# Reads your CSV file, drops the columns that don't help (step 2) and converts text to numbers (step 3).
+# The result is cached as typed NumPy columns in 'training_cache/'. As long as the CSV's contents
+# (its SHA-256 hash) don't change, later runs load that cache instead of parsing the CSV again.
+print(f"\nLoading {args.data}...")
+start_time = time.perf_counter()
 try:
-    df = pd.read_csv('employee_data.csv')
-    print("Dataset loaded successfully. First 5 rows:")
-    print(df.head()) # Display the first few rows to confirm loading
-    print(f"\nDataset shape: {df.shape} (Rows, Columns)")
+    df, encodings, from_cache = load_encoded_data(args.data, use_cache=not args.no_cache)
 except FileNotFoundError:
     # This error occurs if the CSV file isn't found at the specified path.
-    print("Error: 'employee_data.csv' not found in the current directory.")
+    print(f"Error: '{args.data}' not found in the current directory.")
     print("Please ensure the CSV file is renamed to 'employee_data.csv' and placed directly in the 'employee_attrition' folder.")
     # Exiting the script because we can't proceed without data
     exit()
+source = f"cache '{TRAINING_CACHE_DIR}/' (CSV unchanged)" if from_cache else "CSV (parsed and cached)"
+print(f"Dataset loaded from {source} in {time.perf_counter() - start_time:.2f} s. Shape: {df.shape} (Rows, Columns)")
 
 # --- 2. Drop irrelevant columns ---
 # These columns are typically unique identifiers (EmployeeNumber) or constant values
 # across the dataset (EmployeeCount, Over18, StandardHours) and don't help in prediction.
-print("\nDropping irrelevant columns (EmployeeCount, Over18, StandardHours, EmployeeNumber)...")
-df.drop(['EmployeeCount', 'Over18', 'StandardHours', 'EmployeeNumber'], axis=1, inplace=True)
-print(f"New dataset shape after dropping columns: {df.shape}")
+# They were already removed while loading.
+print(f"\nDropped irrelevant columns ({', '.join(DROP_COLUMNS)}).")
 
-# --- 3. Convert categorical columns using LabelEncoder ---
+# --- 3. Convert categorical columns to numbers ---
 # Machine learning models work with numbers, not text.
-# LabelEncoder converts unique text categories into unique numbers (e.g., 'Yes' -> 1, 'No' -> 0).
-# This process is applied to all columns that have 'object' (string) data type.
-le = LabelEncoder() # Create an instance of the LabelEncoder
-print("\nEncoding categorical columns to numerical values:")
-for column in df.select_dtypes(include=['object']).columns:
-    print(f"  Encoding column: '{column}'")
-    df[column] = le.fit_transform(df[column]) # Apply encoding to the column
-
-print("\nCategorical columns encoded. First 5 rows of the modified DataFrame:")
+# Each text column was encoded while loading exactly like LabelEncoder does: the distinct values are
+# sorted and numbered from 0 (e.g., 'No' -> 0, 'Yes' -> 1).
+print("\nCategorical columns encoded to numerical values:")
+for column, levels in encodings.items():
+    print(f"  {column}: " + ', '.join(f"{code}={level}" for code, level in enumerate(levels)))
+
+print("\nFirst 5 rows of the encoded DataFrame:")
 print(df.head()) # Observe how text columns are now numbers
 
 # --- 4. Split features and target ---
 # We separate the data into features (X), which are the input columns used for prediction,
 # and the target (y), which is the column we want to predict ('Attrition').
-# 'Attrition' was already converted to 1 (Yes) or 0 (No) by LabelEncoder.
-X = df.drop('Attrition', axis=1) # X contains all columns EXCEPT 'Attrition'
-y = df['Attrition']  # y contains only the 'Attrition' column
+# 'Attrition' was already converted to 1 (Yes) or 0 (No) in step 3.
+X = df.drop(TARGET_COLUMN, axis=1) # X contains all columns EXCEPT 'Attrition'
+y = df[TARGET_COLUMN]  # y contains only the 'Attrition' column
 
 print(f"\nFeatures (X) shape: {X.shape}")
 print(f"Target (y) shape: {y.shape}")
@@ -84,10 +111,14 @@ print(f"X_test shape: {X_test.shape}, y_test shape: {y_test.shape}")
 # --- 7. Train model ---
 # RandomForestClassifier is a powerful and popular machine learning model
 # for classification tasks. It builds multiple decision trees and combines their outputs.
-print("\nTraining RandomForestClassifier model...")
-model = RandomForestClassifier(random_state=42) # Initialize the model
+# n_jobs=-1 fits the trees on all CPU cores; with random_state fixed the trees are the same either way.
+print(f"\nTraining RandomForestClassifier model ({args.n_estimators} trees, max_depth={args.max_depth}, n_jobs={args.n_jobs})...")
+start_time = time.perf_counter()
+model = RandomForestClassifier(n_estimators=args.n_estimators, max_depth=args.max_depth, random_state=42, n_jobs=args.n_jobs) # Initialize the model
 model.fit(X_train, y_train) # Train the model on the training data
-print("Model training complete.")
+# The API scores one request at a time; parallel predict_proba would only add thread overhead there
+model.set_params(n_jobs=None)
+print(f"Model training complete in {time.perf_counter() - start_time:.2f} s.")
 
 # --- 8. Evaluate ---
 # We use the trained model to make predictions on the unseen test set
@@ -98,17 +129,101 @@ accuracy = accuracy_score(y_test, y_pred) # Calculate the accuracy
 print(f"\nModel Evaluation on Test Set:")
 print(f"Accuracy: {accuracy:.4f}") # Print accuracy (formatted to 4 decimal places)
 
-# --- 9. Save model and scaler ---
+# --- 9. Save model, scaler and feature schema ---
 # It's crucial to save both the trained model and the scaler.
 # When new data comes into your API for prediction, it must be preprocessed
 # using the *exact same* scaling and encoding rules that were used during training.
+# Those rules are saved as 'feature_schema.json': the column order X was fitted with and the
+# category -> code table from step 3. The API and bulk scorer encode every record with it.
 # 'wb' mode means "write binary" mode.
-print("\nSaving trained model (model.pkl) and scaler (scaler.pkl)...")
+print(f"\nSaving trained model (model.pkl), scaler (scaler.pkl) and feature schema ({FEATURE_SCHEMA_FILE})...")
 try:
     pickle.dump(model, open("model.pkl", "wb")) # Save the trained model
     pickle.dump(scaler, open("scaler.pkl", "wb")) # Save the fitted scaler
-    print("Model and Scaler saved successfully! You should now see 'model.pkl' and 'scaler.pkl' in your folder.")
+    FeatureSchema.from_training_frame(X, encodings, TARGET_COLUMN).save(FEATURE_SCHEMA_FILE) # Save the encoding rules
+    print(f"Model, Scaler and Schema saved successfully! You should now see 'model.pkl', 'scaler.pkl' and '{FEATURE_SCHEMA_FILE}' in your folder.")
+except Exception as e:
+    print(f"Error saving model, scaler or schema: {e}")
+
+# --- 10. Export flattened forest ---
+# The API can also serve the model with a lightweight engine (ATTRITION_ENGINE=flat in app.py).
+# It needs every tree flattened into plain NumPy arrays, saved here as 'model_flat/'.
+# 'model_fused/' is the same forest with the scaler folded into the split thresholds
+# (ATTRITION_ENGINE=fused), so the API can score raw feature values without loading scaler.pkl.
+print(f"\nExporting flattened forest ({FLAT_FOREST_DIR}, {FUSED_FOREST_DIR})...")
+try:
+    flat_arrays = flatten_forest(model)
+    save_flat_forest(flat_arrays, FLAT_FOREST_DIR)
+    save_flat_forest(fold_scaler(flat_arrays, scaler), FUSED_FOREST_DIR)
+    print(f"Flattened forest saved successfully! You should now see '{FLAT_FOREST_DIR}' and '{FUSED_FOREST_DIR}' in your folder.")
+except Exception as e:
+    print(f"Error exporting flattened forest: {e}")
+
+# --- 11. Compress: smaller / faster variants of the model ---
+# The trained forest (by default 100 fully grown trees) is large. Smaller versions are built without retraining:
+#   depth_6 / depth_8 / depth_10   every tree cut at that depth
+#   trees_10 / trees_25 / trees_50 the trees that work best together, picked on each tree's out-of-bag rows
+#   float32 / quantized            same predictions with smaller thresholds (float32, or int16 bin numbers)
+#   compact                        50 trees, cut at depth 10, quantized
+# Each is saved in 'model_variants/<name>/' and compared (size, load time, latency, test accuracy) in
+# 'compression_report.json'. Serve one with ATTRITION_MODEL_VARIANT=<name> python app.py.
+if args.no_compress and os.path.isdir(MODEL_VARIANTS_DIR):
+    shutil.rmtree(MODEL_VARIANTS_DIR) # they were built from an earlier model
+    print(f"\nRemoved '{MODEL_VARIANTS_DIR}/' (built from an earlier model).")
+elif not args.no_compress:
+    print(f"\nBuilding compressed model variants ({MODEL_VARIANTS_DIR})...")
+    try:
+        start_time = time.perf_counter()
+        save_model_variants(build_model_variants(model, X_train, y_train), MODEL_VARIANTS_DIR)
+        compression_results = compression_report(model, X_test, y_test, MODEL_VARIANTS_DIR)
+        print(f"Variants built and measured in {time.perf_counter() - start_time:.1f} s.\n")
+        print(f"{'variant':<11}{'trees':>6}{'depth':>6}{'size KB':>9}{'load ms':>9}{'1-row ms':>10}{'test set ms':>13}{'accuracy':>10}{'max proba change':>18}")
+        for result in compression_results:
+            print(f"{result['variant']:<11}{result['n_trees']:>6}{result['max_depth']:>6}{result['bytes'] / 1024:>9.0f}{result['load_ms']:>9.2f}"
+                  f"{result['single_row_ms']:>10.3f}{result['test_batch_ms']:>13.2f}{result['accuracy']:>10.4f}{result['max_proba_change']:>18.4f}")
+        with open(COMPRESSION_REPORT_FILE, 'w') as f:
+            json.dump(compression_results, f, indent=2)
+        print(f"\nReport saved to '{COMPRESSION_REPORT_FILE}'.")
+    except Exception as e:
+        print(f"Error building model variants: {e}")
+
+# --- 12. Publish a new model version ---
+# The files above are also copied into a new version under 'models/' (e.g. models/v0003/) and made
+# the current version. A running API notices the new version within a few seconds and switches to it
+# without a restart; an older version can be re-activated with 'python model_registry.py rollback'.
+print("\nPublishing a new model version to the registry...")
+try:
+    version = ModelRegistry().publish({
+        "model.pkl": "model.pkl",
+        "scaler.pkl": "scaler.pkl",
+        FEATURE_SCHEMA_FILE: FEATURE_SCHEMA_FILE,
+        FLAT_FOREST_DIR: FLAT_FOREST_DIR,
+        FUSED_FOREST_DIR: FUSED_FOREST_DIR,
+        **({MODEL_VARIANTS_DIR: MODEL_VARIANTS_DIR} if os.path.isdir(MODEL_VARIANTS_DIR) else {})
+    }, metadata={'accuracy': round(float(accuracy), 4), 'n_estimators': len(model.estimators_), 'max_depth': args.max_depth})
+    print(f"Published and activated model version '{version}'.")
 except Exception as e:
-    print(f"Error saving model or scaler: {e}")
+    print(f"Error publishing model version: {e}")
+
+# --- 13. Hyperparameter search (optional, --search) ---
+# Trains one forest per combination of SEARCH_GRID in parallel (one core each) and reports, for each,
+# how long it took to train, how big it is, how fast it predicts and how accurate it is.
+# Accuracy here is out-of-bag accuracy on the training set (each row scored by the trees that didn't
+# see it), so picking a setting from this table leaves the test set untouched for step 8.
+# This is a report only: the model saved above is unchanged. Re-run with the settings you prefer,
+# e.g. 'python model_dev.py --n-estimators 200 --max-depth 12'.
+if args.search:
+    print(f"\nRunning hyperparameter search over {SEARCH_GRID}...")
+    start_time = time.perf_counter()
+    search_results = hyperparameter_search(X_train, y_train, X_test, n_jobs=args.n_jobs)
+    print(f"Search finished in {time.perf_counter() - start_time:.1f} s.\n")
+    print(f"{'trees':>6}{'depth':>7}{'OOB acc':>10}{'train s':>9}{'size MB':>9}{'1-row ms':>10}{'1-row ms flat':>15}{'test set ms flat':>18}")
+    for result in search_results: # best out-of-bag accuracy first
+        print(f"{result['n_estimators']:>6}{str(result['max_depth']):>7}{result['oob_accuracy']:>10.4f}{result['train_seconds']:>9.2f}"
+              f"{result['model_bytes'] / 1e6:>9.2f}{result['single_row_ms_sklearn']:>10.2f}{result['single_row_ms_flat']:>15.3f}"
+              f"{result['test_batch_ms_flat']:>18.2f}")
+    with open('hyperparameter_search.json', 'w') as f:
+        json.dump(search_results, f, indent=2)
+    print("\nFull results saved to 'hyperparameter_search.json'.")
 
 print("\n--- Model Development Pipeline Finished ---")
\ No newline at end of file
@@ -0,0 +1,160 @@
+# model_registry.py
+# Versioned model directory with an atomic "current" pointer.
+#
+#   models/
+#     v0001/            model.pkl, scaler.pkl, model_flat/, model_fused/, metadata.json
+#     v0002/
+#     CURRENT           name of the version being served (replaced atomically)
+#     HISTORY           versions in the order they were activated (used for rollback)
+#
+# model_dev.py publishes every trained model as a new version and activates it. The API (app.py)
+# watches CURRENT and hot-swaps to the new version without a restart.
+#
+# Usage:
+#   python model_registry.py list
+#   python model_registry.py activate v0002
+#   python model_registry.py rollback
+
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+REGISTRY_DIR = 'models'
+CURRENT_FILE = 'CURRENT'
+HISTORY_FILE = 'HISTORY'
+METADATA_FILE = 'metadata.json'
+VERSION_PATTERN = re.compile(r'^v(\d+)$')
+
+
+class ModelRegistry:
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = root
+
+    def version_path(self, version):
+        return os.path.join(self.root, version)
+
+    def list_versions(self):
+        # All published versions, oldest first, with their metadata
+        if not os.path.isdir(self.root):
+            return []
+        versions = sorted((name for name in os.listdir(self.root)
+                           if VERSION_PATTERN.match(name) and os.path.isdir(self.version_path(name))),
+                          key=lambda name: int(VERSION_PATTERN.match(name).group(1)))
+        current = self.current_version()
+        return [{'version': version, 'current': version == current, 'metadata': self.metadata(version)}
+                for version in versions]
+
+    def metadata(self, version):
+        try:
+            with open(os.path.join(self.version_path(version), METADATA_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def current_version(self):
+        # None when nothing has been activated yet
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def publish(self, artifacts, metadata=None, activate=True):
+        # Copy artifacts ({name in version dir: source file or directory}) into a new version directory.
+        # The version is assembled in a temporary directory and renamed into place, so a half-written
+        # version is never visible. Returns the new version name.
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=self.root)
+        try:
+            for name, source in artifacts.items():
+                target = os.path.join(staging, name)
+                if os.path.isdir(source):
+                    shutil.copytree(source, target)
+                else:
+                    shutil.copy2(source, target)
+            with open(os.path.join(staging, METADATA_FILE), 'w') as f:
+                json.dump(dict(metadata or {}, published_at=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                               artifacts=sorted(artifacts)), f, indent=2)
+            while True:
+                existing = [int(VERSION_PATTERN.match(name).group(1)) for name in os.listdir(self.root)
+                            if VERSION_PATTERN.match(name)]
+                version = f"v{max(existing, default=0) + 1:04d}"
+                try:
+                    os.rename(staging, self.version_path(version))
+                    break
+                except OSError:
+                    if not os.path.isdir(self.version_path(version)):
+                        raise
+                    # Another publisher took this number first; try the next one
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        if activate:
+            self.activate(version)
+        return version
+
+    def activate(self, version):
+        # Point CURRENT at an existing version (atomic rename) and record it in HISTORY
+        if not os.path.isdir(self.version_path(version)):
+            raise KeyError(f"Unknown model version '{version}'.")
+        history = self._read_history()
+        if not history or history[-1] != version:
+            history.append(version)
+        self._write_atomic(HISTORY_FILE, '\n'.join(history) + '\n')
+        self._write_atomic(CURRENT_FILE, version + '\n')
+        return version
+
+    def previous_version(self):
+        # The version rollback() would re-activate, or None if there is none
+        history = self._read_history()
+        current = self.current_version()
+        while history and history[-1] == current:
+            history.pop()
+        return history[-1] if history else None
+
+    def rollback(self):
+        # Re-activate the version that was active before the current one
+        previous = self.previous_version()
+        if previous is None:
+            raise ValueError("No earlier version to roll back to.")
+        history = self._read_history()
+        while history and history[-1] != previous:
+            history.pop()
+        self._write_atomic(HISTORY_FILE, '\n'.join(history) + '\n')
+        self._write_atomic(CURRENT_FILE, previous + '\n')
+        return previous
+
+    def _read_history(self):
+        try:
+            with open(os.path.join(self.root, HISTORY_FILE)) as f:
+                return [line.strip() for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def _write_atomic(self, name, content):
+        path = os.path.join(self.root, name)
+        with open(path + '.tmp', 'w') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+
+if __name__ == '__main__':
+    registry = ModelRegistry()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    if command == 'list':
+        for entry in registry.list_versions():
+            marker = '*' if entry['current'] else ' '
+            print(f"{marker} {entry['version']}  {json.dumps(entry['metadata'])}")
+    elif command == 'activate' and len(sys.argv) > 2:
+        print(f"Activated {registry.activate(sys.argv[2])}")
+    elif command == 'rollback':
+        print(f"Rolled back to {registry.rollback()}")
+    else:
+        print("Usage: python model_registry.py [list | activate <version> | rollback]")
+        sys.exit(1)
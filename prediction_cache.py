@@ -0,0 +1,172 @@
+# prediction_cache.py
+# Bounded LRU cache of predictions, keyed on a hash of the ordered feature vector.
+# Dashboards re-query the same employees over and over; a cache hit skips the forest entirely.
+# - max_entries / ttl_seconds bound its size and the age of an entry.
+# - Entries are dropped automatically when any of the watched model files (e.g. model.pkl, scaler.pkl) change.
+# - Keys can be namespaced by model version, so entries of different registry versions never mix.
+# - With persist_path, entries are also written to a local SQLite file and reloaded on start-up,
+#   so the cache survives worker restarts.
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from instrumentation import stage
+
+# How often (seconds) the watched model files are re-checked for changes.
+FINGERPRINT_CHECK_INTERVAL = 1.0
+
+
+class PredictionCache:
+    def __init__(self, max_entries=10000, ttl_seconds=0, persist_path=None, watch_paths=()):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds # 0 means entries never expire
+        self.persist_path = persist_path
+        self.watch_paths = list(watch_paths)
+        self._entries = OrderedDict() # key -> (created_at, raw_prediction, probabilities)
+        self._lock = threading.Lock()
+        self._hits = self._misses = self._evictions = self._expirations = self._invalidations = 0
+        self._fingerprint = self._compute_fingerprint()
+        self._next_fingerprint_check = time.monotonic() + FINGERPRINT_CHECK_INTERVAL
+        self._db = None
+        if persist_path:
+            self._open_store()
+
+    # --- Keys and model fingerprint ---
+    @staticmethod
+    def key(row, namespace=''):
+        # Hash of the namespace + ordered float64 feature vector. Adding 0.0 turns -0.0 into 0.0 so both share a key.
+        row = np.ascontiguousarray(row, dtype=np.float64) + 0.0
+        return hashlib.blake2b(namespace.encode() + b'\0' + row.tobytes(), digest_size=16).hexdigest()
+
+    def _compute_fingerprint(self):
+        # Size + modification time of every watched file; any retrained / replaced artifact changes it.
+        parts = []
+        for path in self.watch_paths:
+            try:
+                stat = os.stat(path)
+                parts.append(f"{path}:{stat.st_size}:{stat.st_mtime_ns}")
+            except OSError:
+                parts.append(f"{path}:missing")
+        return hashlib.blake2b('|'.join(parts).encode(), digest_size=16).hexdigest()
+
+    def _check_fingerprint(self):
+        # Called with the lock held. Throttled so the hot path doesn't stat files on every request.
+        now = time.monotonic()
+        if now < self._next_fingerprint_check:
+            return
+        self._next_fingerprint_check = now + FINGERPRINT_CHECK_INTERVAL
+        fingerprint = self._compute_fingerprint()
+        if fingerprint != self._fingerprint:
+            self._fingerprint = fingerprint
+            self._entries.clear()
+            self._invalidations += 1
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions WHERE fingerprint != ?", (fingerprint,))
+                self._db.commit()
+
+    # --- Lookups ---
+    def get(self, key):
+        # Returns (raw_prediction, probabilities) or None on a miss.
+        with self._lock:
+            self._check_fingerprint()
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            if self.ttl_seconds and time.time() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self._expirations += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1], entry[2]
+
+    def put(self, key, raw_prediction, probabilities):
+        self.put_many([(key, raw_prediction, probabilities)])
+
+    def put_many(self, items):
+        # Insert several (key, raw_prediction, probabilities) results with one lock and one disk commit
+        now = time.time()
+        entries = [(key, (now, raw_prediction, tuple(float(p) for p in probabilities))) for key, raw_prediction, probabilities in items]
+        with self._lock:
+            for key, entry in entries:
+                self._insert(key, entry)
+            if self._db is not None:
+                self._db.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?, ?)",
+                                     [(self._fingerprint, key, entry[0], str(entry[1]), ','.join(map(repr, entry[2])))
+                                      for key, entry in entries])
+                self._db.commit()
+
+    def _insert(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted_key, _ = self._entries.popitem(last=False)
+            self._evictions += 1
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions WHERE key = ?", (evicted_key,))
+
+    def score(self, input_array, score_fn, namespace=''):
+        # Same contract as score_matrix(): returns (prediction, prediction_proba) for every row,
+        # but only the rows that miss the cache are passed to score_fn (in one call).
+        with stage('cache_lookup'):
+            keys = [self.key(row, namespace) for row in input_array]
+            cached = [self.get(key) for key in keys]
+        misses = [i for i, entry in enumerate(cached) if entry is None]
+        if misses:
+            prediction, prediction_proba = score_fn(input_array[misses])
+            for j, i in enumerate(misses):
+                cached[i] = (prediction[j].item(), prediction_proba[j])
+            with stage('cache_store'):
+                self.put_many([(keys[i], *cached[i]) for i in misses])
+        return np.array([entry[0] for entry in cached]), np.array([entry[1] for entry in cached], dtype=np.float64)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM predictions")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': True,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'persist_path': self.persist_path,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations
+            }
+
+    # --- On-disk store ---
+    def _open_store(self):
+        # One SQLite file shared by all workers; only entries for the current model fingerprint are kept.
+        self._db = sqlite3.connect(self.persist_path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS predictions (fingerprint TEXT, key TEXT, created_at REAL, "
+                         "raw_prediction TEXT, probabilities TEXT, PRIMARY KEY (fingerprint, key))")
+        self._db.execute("DELETE FROM predictions WHERE fingerprint != ?", (self._fingerprint,))
+        if self.ttl_seconds:
+            self._db.execute("DELETE FROM predictions WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self._db.execute("DELETE FROM predictions WHERE key NOT IN "
+                         "(SELECT key FROM predictions ORDER BY created_at DESC LIMIT ?)", (self.max_entries,))
+        self._db.commit()
+        # Warm the in-memory LRU with the newest entries (oldest first, so the newest end up most recent)
+        rows = self._db.execute("SELECT key, created_at, raw_prediction, probabilities FROM predictions "
+                                "ORDER BY created_at DESC LIMIT ?", (self.max_entries,)).fetchall()
+        for key, created_at, raw_prediction, probabilities in reversed(rows):
+            raw_prediction = int(raw_prediction) if raw_prediction.lstrip('-').isdigit() else raw_prediction
+            self._entries[key] = (created_at, raw_prediction, tuple(float(p) for p in probabilities.split(',')))
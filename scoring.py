@@ -0,0 +1,144 @@
+# scoring.py
+# Shared preprocessing and scoring helpers.
+# model_dev.py, the Flask API (app.py) and the bulk scorer (bulk_score.py) all import these,
+# so raw employee records are always prepared exactly the way the model was trained.
+
+import json
+import numpy as np
+import pandas as pd
+from feature_schema import FeatureSchema, FEATURE_SCHEMA_FILE
+from instrumentation import stage
+
+# --- Data preparation rules (must match model_dev.py) ---
+# Identifier / constant columns that model_dev.py drops before training.
+DROP_COLUMNS = ['EmployeeCount', 'Over18', 'StandardHours', 'EmployeeNumber']
+TARGET_COLUMN = 'Attrition'
+# Passed through to bulk scoring output (when present) so results can be matched back to employees.
+ID_COLUMN = 'EmployeeNumber'
+# The column order the model was fitted on and the category codes are saved by model_dev.py in
+# feature_schema.json (see feature_schema.py).
+
+# Default number of rows read and scored at a time by the bulk scorer.
+DEFAULT_CHUNK_ROWS = 5000
+
+
+def default_schema():
+    # feature_schema.json next to this file, loaded on first use
+    global _default_schema
+    if _default_schema is None:
+        _default_schema = FeatureSchema.load(FEATURE_SCHEMA_FILE)
+    return _default_schema
+
+_default_schema = None
+
+
+def prepare_features(df, schema=None):
+    # Turn a chunk of raw records into a float matrix in the schema's feature order.
+    # Categorical columns may hold either the raw text ("Travel_Rarely") or the numeric code (2).
+    # Returns the matrix plus a boolean mask of rows where every feature is a valid number.
+    return (schema or default_schema()).encode_frame(df)
+
+
+def score_matrix(model, scaler, input_array):
+    # Scale every row at once and run the forest a single time.
+    # The label is derived from the probabilities (exactly what model.predict does internally),
+    # so we don't pay for a second pass over all the trees.
+    # scaler is None for the fused engine, whose thresholds already include the scaling.
+    with stage('scale'):
+        data_scaled = scaler.transform(input_array) if scaler is not None else input_array
+    with stage('forest'):
+        prediction_proba = model.predict_proba(data_scaled)
+    prediction = model.classes_.take(np.argmax(prediction_proba, axis=1))
+    return prediction, prediction_proba
+
+
+def format_prediction(raw_prediction, proba_row):
+    return {
+        'prediction': "Yes Attrition" if raw_prediction == 1 else "No Attrition",
+        'raw_prediction': int(raw_prediction),
+        'probability_no_attrition': float(proba_row[0]),
+        'probability_yes_attrition': float(proba_row[1])
+    }
+
+
+def strongest_features(contributions, top):
+    # Column indices of each row's `top` largest contributions by size, largest first
+    return np.argsort(-np.abs(contributions), axis=1, kind='stable')[:, :max(top, 0)]
+
+def format_explanation(raw_prediction, proba_row, contributions_row, strongest, bias, feature_order, record):
+    # format_prediction() plus the per-feature contributions to probability_yes_attrition (see forest_explainer.py).
+    # contributions_row and strongest are plain lists (convert whole batches with .tolist() first).
+    return {
+        **format_prediction(raw_prediction, proba_row),
+        'bias': bias,
+        'contributions': dict(zip(feature_order, contributions_row)),
+        'top_factors': [{'feature': feature_order[j], 'value': record.get(feature_order[j]),
+                         'contribution': contributions_row[j]} for j in strongest]
+    }
+
+
+# --- Chunked bulk scoring ---
+def _clean_id(value):
+    # NDJSON ids come back from pandas as floats (7.0) or NaN when missing; keep the output valid JSON
+    if isinstance(value, float):
+        return None if value != value else (int(value) if value.is_integer() else value)
+    return value
+
+
+def detect_format(filename, default='csv'):
+    # Guess the input/output format from a file name: .csv, or .jsonl / .ndjson / .json for NDJSON.
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'ndjson'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def iter_record_chunks(source, input_format='csv', chunk_rows=DEFAULT_CHUNK_ROWS):
+    # Read a CSV or newline-delimited JSON file (path or file object) chunk_rows records at a time,
+    # so memory use stays flat no matter how big the file is.
+    if input_format == 'csv':
+        return pd.read_csv(source, chunksize=chunk_rows)
+    if input_format == 'ndjson':
+        return pd.read_json(source, lines=True, chunksize=chunk_rows, dtype=False)
+    raise ValueError(f"Unsupported input format: {input_format!r}. Use 'csv' or 'ndjson'.")
+
+
+def iter_scored_chunks(chunks, score_fn, output_format='ndjson', schema=None):
+    # Score each chunk with one vectorized score_fn(matrix) call and yield the results
+    # for that chunk as a single block of text (NDJSON lines, or CSV rows with a header first).
+    # Rows with missing / unknown values get an error entry instead of failing the chunk.
+    schema = schema or default_schema()
+    row_offset = 0
+    first_chunk = True
+    for chunk in chunks:
+        feature_matrix, valid_rows = prepare_features(chunk, schema)
+        results = [None] * len(chunk)
+
+        if valid_rows.any():
+            prediction, prediction_proba = score_fn(feature_matrix[valid_rows])
+            for j, i in enumerate(np.flatnonzero(valid_rows)):
+                results[i] = format_prediction(prediction[j], prediction_proba[j])
+        for i in np.flatnonzero(~valid_rows):
+            bad_columns = [schema.feature_order[j] for j in np.flatnonzero(~np.isfinite(feature_matrix[i]))]
+            results[i] = {'error': f"Missing or invalid value for: {', '.join(bad_columns)}"}
+
+        # Put the row number (and employee id, if the file has one) first in every result
+        ids = [_clean_id(value) for value in chunk[ID_COLUMN].tolist()] if ID_COLUMN in chunk.columns else None
+        for i, result in enumerate(results):
+            key = {'row': row_offset + i}
+            if ids is not None:
+                key[ID_COLUMN] = ids[i]
+            results[i] = {**key, **result}
+        row_offset += len(chunk)
+
+        if output_format == 'ndjson':
+            yield ''.join(json.dumps(result, default=str) + '\n' for result in results)
+        elif output_format == 'csv':
+            columns = ['row'] + ([ID_COLUMN] if ids is not None else []) + \
+                      ['prediction', 'raw_prediction', 'probability_no_attrition', 'probability_yes_attrition', 'error']
+            yield pd.DataFrame(results, columns=columns).to_csv(index=False, header=first_chunk)
+        else:
+            raise ValueError(f"Unsupported output format: {output_format!r}. Use 'csv' or 'ndjson'.")
+        first_chunk = False
@@ -3,8 +3,8 @@ import requests
 import json # Added import for json module
 
 # --- IMPORTANT: FILL IN REALISTIC NUMERICAL VALUES FOR EACH FEATURE ---
-# These values must correspond to the order of expected_features_order in app.py.
-# For categorical features, use the numerical values that LabelEncoder assigned in model_dev.py.
+# Every feature in expected_features_order in app.py (feature_schema.json) must be present.
+# For categorical features, use either the category name (e.g. "Travel_Rarely") or its numerical code from feature_schema.json.
 test_data = {
     "Age": 30,
     "DailyRate": 800,
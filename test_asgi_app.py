@@ -0,0 +1,106 @@
+# test_asgi_app.py
+# Tests for the async entry point (asgi_app.py): same /predict and /predict_batch contract as the Flask app,
+# scoring in a process pool, and 503 backpressure when the pool is saturated.
+# The ASGI app is called directly, so no ASGI server needs to be installed.
+# Run with: python -m pytest test_asgi_app.py
+
+import asyncio
+import json
+import pandas as pd
+import pytest
+import app as flask_app
+import asgi_app
+from feature_schema import FeatureSchema
+from scoring import prepare_features
+
+
+@pytest.fixture(scope='module')
+def pool():
+    # A small real process pool, shared by the tests in this file
+    original_pool = asgi_app.pool
+    pool = asgi_app.ScoringPool(n_workers=2, max_queue=4)
+    asgi_app.pool = pool
+    asyncio.run(pool.warm_up())
+    yield pool
+    pool.shutdown()
+    asgi_app.pool = original_pool
+
+
+@pytest.fixture(scope='module')
+def employees():
+    feature_matrix, valid_rows = prepare_features(pd.read_csv('employee_data.csv').head(20))
+    return [dict(zip(flask_app.expected_features_order, values)) for values in feature_matrix[valid_rows].tolist()]
+
+
+def call(method, path, payload=None):
+    # Run one request through the ASGI app; returns (status, headers, parsed JSON body)
+    body = json.dumps(payload).encode() if payload is not None else b''
+    messages = [{'type': 'http.request', 'body': body[:10], 'more_body': True},
+                {'type': 'http.request', 'body': body[10:], 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'headers': []}
+    asyncio.run(asgi_app.app(scope, receive, send))
+    headers = dict(sent[0]['headers'])
+    return sent[0]['status'], headers, json.loads(sent[1]['body'])
+
+
+def test_predict_matches_flask_app(pool, employees):
+    client = flask_app.app.test_client()
+    for employee in employees[:5]:
+        status, _, response = call('POST', '/predict', employee)
+        assert status == 200
+        assert response == client.post('/predict', json=employee).json
+
+
+def test_predict_batch_matches_flask_app(pool, employees):
+    records = employees + [{'Age': 30}, 'not a record']
+    status, _, response = call('POST', '/predict_batch', records)
+    assert status == 200
+    assert response == flask_app.app.test_client().post('/predict_batch', json=records).json
+    assert response['n_errors'] == 2
+
+
+def test_invalid_requests(pool):
+    client = flask_app.app.test_client()
+    for path, payload in [('/predict', [1, 2]), ('/predict', {'Age': 30}), ('/predict_batch', {'Age': 30})]:
+        status, _, response = call('POST', path, payload)
+        flask_response = client.post(path, json=payload)
+        assert status == flask_response.status_code == 400
+        assert response == flask_response.json
+    assert 'Missing input feature' in call('POST', '/predict', {'Age': 30})[2]['error']
+    assert call('GET', '/predict')[0] == 405
+    assert call('POST', '/unknown', {})[0] == 404
+
+
+def test_saturated_pool_returns_503(pool, employees):
+    pool.in_flight = pool.max_queue # pretend every slot is taken
+    try:
+        status, headers, response = call('POST', '/predict', employees[0])
+    finally:
+        pool.in_flight = 0
+    assert status == 503 and headers[b'retry-after'] == b'1'
+    assert pool.stats()['rejected'] >= 1
+    assert call('POST', '/predict', employees[0])[0] == 200
+
+
+def test_records_are_encoded_with_the_schema_of_the_serving_version(employees, monkeypatch):
+    # A newer version whose schema knows one more BusinessTravel level than the top-level feature_schema.json.
+    # The pool process encodes with the schema of the version it serves, never the top-level file.
+    state = flask_app.load_model()
+    categories = {**state.schema.categories, 'BusinessTravel': state.schema.categories['BusinessTravel'] + ['Travel_Monthly']}
+    schema = FeatureSchema(state.schema.feature_order, categories, state.schema.dtypes, state.schema.target)
+    monkeypatch.setattr(flask_app, 'load_model', lambda: state._replace(version='v0007', schema=schema))
+    record = {**employees[0], 'BusinessTravel': 'Travel_Monthly'}
+    status, body, n_rows = asgi_app._predict_in_worker(json.dumps(record).encode())
+    assert status == 200 and n_rows == 1 and json.loads(body)['model_version'] == 'v0007'
+    status, body, n_rows = asgi_app._predict_batch_in_worker(json.dumps([record, {'Age': 30}]).encode())
+    assert status == 200 and n_rows == 1 and json.loads(body)['n_errors'] == 1
+    with pytest.raises(ValueError): # the top-level schema would have rejected it
+        flask_app.feature_schema.encode_record(record)
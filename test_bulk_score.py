@@ -0,0 +1,98 @@
+# test_bulk_score.py
+# Tests for bulk file scoring: the /predict_file endpoint (app.py) and the command-line scorer (bulk_score.py).
+# Run with: python -m pytest test_bulk_score.py
+
+import io
+import json
+import pandas as pd
+import pytest
+import app
+import bulk_score
+
+
+@pytest.fixture(scope='module')
+def employees():
+    return pd.read_csv('employee_data.csv').head(25)
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def results_of(text):
+    return [json.loads(line) for line in text.splitlines()]
+
+
+# --- /predict_file ---
+def test_csv_upload_scores_every_row(client, employees):
+    body = employees.to_csv(index=False).encode()
+    response = client.post('/predict_file?chunk_rows=10', data={'file': (io.BytesIO(body), 'employees.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 200
+    results = results_of(response.get_data(as_text=True))
+    assert [result['row'] for result in results] == list(range(len(employees)))
+    assert [result['EmployeeNumber'] for result in results] == employees['EmployeeNumber'].tolist()
+    assert all('prediction' in result for result in results)
+
+
+def test_ndjson_body_with_a_bad_row(client, employees):
+    records = employees.head(3).to_dict(orient='records')
+    records[1]['BusinessTravel'] = 'Travel_Sometimes'
+    body = ''.join(json.dumps(record) + '\n' for record in records)
+    response = client.post('/predict_file?output=csv', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    rows = pd.read_csv(io.StringIO(response.get_data(as_text=True)))
+    assert len(rows) == 3
+    assert pd.isna(rows['error'][0]) and pd.isna(rows['error'][2])
+    assert 'BusinessTravel' in rows['error'][1]
+
+
+def test_missing_columns_is_a_400(client, employees):
+    body = employees.drop(columns=['OverTime']).to_csv(index=False)
+    response = client.post('/predict_file', data=body, content_type='text/csv')
+    assert response.status_code == 400
+    assert 'OverTime' in response.get_json()['error']
+
+
+def test_empty_file_is_a_400(client):
+    response = client.post('/predict_file', data={'file': (io.BytesIO(b''), 'employees.csv')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+def test_unknown_format_is_a_400(client, employees):
+    response = client.post('/predict_file?format=xml', data=employees.to_csv(index=False), content_type='text/csv')
+    assert response.status_code == 400
+    assert 'xml' in response.get_json()['error']
+
+
+# --- bulk_score.py ---
+def test_cli_scores_csv_to_ndjson(employees, tmp_path):
+    employees.to_csv(tmp_path / 'employees.csv', index=False)
+    output = tmp_path / 'scores.ndjson'
+    assert bulk_score.main([str(tmp_path / 'employees.csv'), '-o', str(output), '--chunk-rows', '7']) == 0
+    results = results_of(output.read_text())
+    assert len(results) == len(employees) and all('prediction' in result for result in results)
+
+
+def test_cli_scores_ndjson_to_csv_with_a_bad_row(employees, tmp_path):
+    records = employees.head(4).to_dict(orient='records')
+    records[2]['Age'] = 'forty'
+    (tmp_path / 'employees.jsonl').write_text(''.join(json.dumps(record) + '\n' for record in records))
+    output = tmp_path / 'scores.csv'
+    assert bulk_score.main([str(tmp_path / 'employees.jsonl'), '-o', str(output)]) == 0
+    rows = pd.read_csv(output)
+    assert len(rows) == 4
+    assert rows['error'].notna().tolist() == [False, False, True, False]
+
+
+@pytest.mark.parametrize('content', ['', 'Age,DailyRate\n30,800\n'])
+def test_cli_reports_unreadable_input(content, tmp_path, capsys):
+    # An empty file and a file with missing columns: an error message, exit code 1 and no output file
+    (tmp_path / 'employees.csv').write_text(content)
+    output = tmp_path / 'scores.ndjson'
+    assert bulk_score.main([str(tmp_path / 'employees.csv'), '-o', str(output)]) == 1
+    assert 'Error' in capsys.readouterr().err
+    assert not output.exists()
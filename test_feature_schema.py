@@ -0,0 +1,108 @@
+# test_feature_schema.py
+# Tests for the feature schema shared by training and serving (feature_schema.py).
+# Run with: python -m pytest test_feature_schema.py
+
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+import app
+from feature_schema import FeatureSchema
+from training_pipeline import load_encoded_data
+from scoring import TARGET_COLUMN
+
+
+@pytest.fixture(scope='module')
+def schema():
+    return FeatureSchema.load()
+
+
+@pytest.fixture(scope='module')
+def raw_employees():
+    return pd.read_csv('employee_data.csv').head(200)
+
+
+def test_schema_matches_scaler_and_training_encoding(schema, tmp_path):
+    with open('scaler.pkl', 'rb') as f:
+        scaler = pickle.load(f)
+    assert schema.feature_order == list(scaler.feature_names_in_)
+    df, encodings, _ = load_encoded_data('employee_data.csv', cache_dir=str(tmp_path))
+    X = df.drop(columns=TARGET_COLUMN)
+    rebuilt = FeatureSchema.from_training_frame(X, encodings, TARGET_COLUMN)
+    assert rebuilt.to_dict() == schema.to_dict()
+    feature_matrix, valid_rows = schema.encode_frame(pd.read_csv('employee_data.csv'))
+    assert valid_rows.all()
+    assert np.array_equal(feature_matrix, X.to_numpy(dtype=np.float64))
+
+
+def test_raw_values_and_codes_encode_the_same(schema, raw_employees):
+    feature_matrix, _ = schema.encode_frame(raw_employees)
+    raw_records = raw_employees[schema.feature_order].to_dict('records')
+    code_records = [dict(zip(schema.feature_order, row)) for row in feature_matrix.tolist()]
+    batch_matrix, valid_rows, row_errors = schema.encode_records(raw_records)
+    assert valid_rows.all() and not row_errors
+    assert np.array_equal(batch_matrix, feature_matrix)
+    assert np.array_equal(schema.encode_records(code_records)[0], feature_matrix)
+    for i in range(10):
+        assert np.array_equal(schema.encode_record(raw_records[i]), feature_matrix[i:i + 1])
+
+
+def test_invalid_records_get_row_errors(schema, raw_employees):
+    records = raw_employees[schema.feature_order].head(4).to_dict('records')
+    records[1]['BusinessTravel'] = 'Sometimes'
+    del records[2]['Age']
+    records[3]['MonthlyIncome'] = float('nan')
+    _, valid_rows, row_errors = schema.encode_records(records + ['not a record'])
+    assert valid_rows.tolist() == [True, False, False, False, False]
+    assert "'BusinessTravel'" in row_errors[1] and 'Travel_Rarely' in row_errors[1]
+    assert row_errors[2].startswith("Missing input feature: 'Age'")
+    assert 'NaN or infinity' in row_errors[3]
+    assert 'JSON object' in row_errors[4]
+    with pytest.raises(ValueError):
+        schema.encode_record(records[1])
+
+
+def test_api_accepts_raw_category_names(raw_employees):
+    client = app.app.test_client()
+    record = raw_employees[app.expected_features_order].iloc[0].to_dict()
+    record = {feature: value.item() if hasattr(value, 'item') else value for feature, value in record.items()}
+    codes = dict(zip(app.expected_features_order, app.feature_schema.encode_record(record)[0].tolist()))
+    by_name = client.post('/predict', json=record)
+    assert by_name.status_code == 200
+    assert by_name.json == client.post('/predict', json=codes).json
+    bad = client.post('/predict', json={**record, 'OverTime': 'Maybe'})
+    assert bad.status_code == 400 and "'OverTime'" in bad.json['error']
+
+
+@pytest.mark.parametrize('value', [[1, 2], {'code': 1}])
+def test_list_and_dict_values_are_row_errors_not_server_errors(raw_employees, value):
+    client = app.app.test_client()
+    records = raw_employees[app.expected_features_order].head(3).to_dict('records')
+    records[1] = {**records[1], 'BusinessTravel': value}
+    records[2] = {**records[2], 'Age': value}
+    batch = client.post('/predict_batch', json=records)
+    assert batch.status_code == 200
+    assert batch.json['n_errors'] == 2 and 'prediction' in batch.json['predictions'][0]
+    assert "'BusinessTravel'" in batch.json['predictions'][1]['error']
+    assert "'Age'" in batch.json['predictions'][2]['error']
+    for endpoint in ('/predict', '/explain'):
+        response = client.post(endpoint, json=records[1])
+        assert response.status_code == 400 and "'BusinessTravel'" in response.json['error']
+
+
+@pytest.mark.parametrize('code', [99, -1, 2.5, '7'])
+def test_out_of_range_category_codes_are_rejected(schema, raw_employees, code):
+    record = {feature: value.item() if hasattr(value, 'item') else value
+              for feature, value in raw_employees[schema.feature_order].iloc[0].to_dict().items()}
+    record['BusinessTravel'] = code
+    with pytest.raises(ValueError, match='Travel_Rarely'):
+        schema.encode_record(record)
+    _, valid_rows, row_errors = schema.encode_records([record])
+    assert not valid_rows[0] and 'Travel_Rarely' in row_errors[0]
+    frame = raw_employees.head(2).copy()
+    frame['BusinessTravel'] = [2, code] if not isinstance(code, str) else ['Travel_Rarely', code]
+    assert schema.encode_frame(frame)[1].tolist() == [True, False]
+    response = app.app.test_client().post('/predict', json=record)
+    assert response.status_code == 400 and 'Travel_Rarely' in response.json['error']
+    # Valid codes, as numbers or text, are still accepted
+    assert schema.encode_record({**record, 'BusinessTravel': '2'})[0, schema.feature_order.index('BusinessTravel')] == 2.0
@@ -0,0 +1,190 @@
+# test_forest_engine.py
+# Parity tests for the flat-array inference engine (forest_engine.py).
+# The flattened forest must return exactly the same probabilities as the saved sklearn model.
+# Run with: python -m pytest test_forest_engine.py
+
+import json
+import os
+import pickle
+import subprocess
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+from forest_engine import (FlatForest, flatten_forest, fold_scaler, save_flat_forest, prune_depth, select_trees,
+                           compact_arrays, quantize_thresholds)
+from scoring import prepare_features
+
+
+@pytest.fixture(scope='module')
+def model():
+    with open('model.pkl', 'rb') as f:
+        return pickle.load(f)
+
+
+@pytest.fixture(scope='module')
+def scaler():
+    with open('scaler.pkl', 'rb') as f:
+        return pickle.load(f)
+
+
+@pytest.fixture(scope='module')
+def employees():
+    feature_matrix, _ = prepare_features(pd.read_csv('employee_data.csv'))
+    return feature_matrix
+
+
+@pytest.fixture(scope='module')
+def scaled_employees(scaler, employees):
+    return scaler.transform(employees)
+
+
+def test_predict_proba_matches_sklearn_on_training_data(model, scaled_employees):
+    flat_forest = FlatForest.from_model(model)
+    assert np.array_equal(flat_forest.predict_proba(scaled_employees), model.predict_proba(scaled_employees))
+    assert np.array_equal(flat_forest.predict(scaled_employees), model.predict(scaled_employees))
+
+
+def test_predict_proba_matches_sklearn_on_random_and_missing_values(model):
+    rows = np.random.default_rng(0).normal(scale=3.0, size=(5000, model.n_features_in_))
+    rows[::7, 3] = np.nan
+    flat_forest = FlatForest.from_model(model)
+    assert np.array_equal(flat_forest.predict_proba(rows), model.predict_proba(rows))
+
+
+def test_single_row_matches_sklearn(model, scaled_employees):
+    flat_forest = FlatForest.from_model(model)
+    for i in range(20):
+        row = scaled_employees[i:i + 1]
+        assert np.array_equal(flat_forest.predict_proba(row), model.predict_proba(row))
+
+
+def test_saved_artifact_round_trip(model, scaled_employees, tmp_path):
+    directory = tmp_path / 'model_flat'
+    save_flat_forest(flatten_forest(model), directory)
+    for mmap in (True, False):
+        flat_forest = FlatForest.load(directory, mmap=mmap)
+        assert np.array_equal(flat_forest.predict_proba(scaled_employees), model.predict_proba(scaled_employees))
+
+
+def test_saved_artifact_stores_children_once_and_reads_older_formats(model, scaled_employees, tmp_path):
+    directory = tmp_path / 'model_flat'
+    arrays = flatten_forest(model)
+    # An export in format version 1, with separate left / right child arrays
+    save_flat_forest(arrays, directory)
+    manifest = json.loads((directory / 'manifest.json').read_text())
+    for name in ('children_left', 'children_right'):
+        np.save(directory / f'{name}.npy', arrays[name])
+    (directory / 'manifest.json').write_text(json.dumps({**manifest, 'format_version': 1, 'arrays': manifest['arrays'] + ['children_left', 'children_right']}))
+    assert np.array_equal(FlatForest.load(directory).predict_proba(scaled_employees), model.predict_proba(scaled_employees))
+    # Overwriting it with the current format drops the redundant files
+    save_flat_forest(arrays, directory)
+    assert not (directory / 'children_left.npy').exists() and not (directory / 'children_right.npy').exists()
+    flat_forest = FlatForest.load(directory)
+    assert np.array_equal(flat_forest.children_left, arrays['children_left'])
+    assert np.array_equal(flat_forest.children_right, arrays['children_right'])
+    assert np.array_equal(flat_forest.predict_proba(scaled_employees), model.predict_proba(scaled_employees))
+
+
+def test_saved_artifact_is_memory_mapped(model, tmp_path):
+    directory = tmp_path / 'model_flat'
+    save_flat_forest(flatten_forest(model), directory)
+    flat_forest = FlatForest.load(directory)
+    assert isinstance(flat_forest.threshold.base, np.memmap)
+    assert not flat_forest.threshold.flags.writeable
+
+
+def test_committed_artifact_matches_model(model, scaled_employees):
+    assert np.array_equal(FlatForest.load('model_flat').predict_proba(scaled_employees),
+                          model.predict_proba(scaled_employees))
+
+
+def test_rejects_wrong_number_of_features(model):
+    with pytest.raises(ValueError):
+        FlatForest.from_model(model).predict_proba(np.zeros((1, model.n_features_in_ - 1)))
+
+
+# --- Fused preprocessing (scaler folded into the thresholds) ---
+def test_fused_forest_matches_scaler_then_model(model, scaler, employees):
+    fused_forest = FlatForest(fold_scaler(flatten_forest(model), scaler))
+    assert np.array_equal(fused_forest.predict_proba(employees), model.predict_proba(scaler.transform(employees)))
+
+
+def test_fused_forest_matches_on_values_at_split_boundaries(model, scaler, employees):
+    # Put every raw split boundary (threshold * scale + mean) and its next float into a row,
+    # where rounding differences between the two paths would show up first.
+    flat_arrays = flatten_forest(model)
+    internal = flat_arrays['children_left'] != np.arange(len(flat_arrays['feature']))
+    features = flat_arrays['feature'][internal]
+    boundaries = flat_arrays['threshold'][internal] * scaler.scale_[features] + scaler.mean_[features]
+    fused_forest = FlatForest(fold_scaler(flat_arrays, scaler))
+    for values in (boundaries, np.nextafter(boundaries, np.inf), np.nextafter(boundaries, -np.inf)):
+        rows = np.repeat(employees[:1], len(features), axis=0)
+        rows[np.arange(len(features)), features] = values
+        assert np.array_equal(fused_forest.predict_proba(rows), model.predict_proba(scaler.transform(rows)))
+
+
+def test_committed_fused_artifact_matches_model(model, scaler, employees):
+    assert np.array_equal(FlatForest.load('model_fused').predict_proba(employees),
+                          model.predict_proba(scaler.transform(employees)))
+
+
+# --- Smaller variants (compact dtypes, quantized thresholds, pruning, tree subsets) ---
+def test_compact_and_quantized_forests_reach_the_same_leaves(model, scaled_employees):
+    rows = np.vstack([scaled_employees, np.random.default_rng(1).normal(scale=3.0, size=(2000, model.n_features_in_))])
+    arrays = flatten_forest(model)
+    expected_leaves = FlatForest(arrays).apply(rows)
+    compact = compact_arrays(arrays)
+    for variant in (compact, quantize_thresholds(compact), quantize_thresholds(arrays)):
+        forest = FlatForest(variant)
+        assert np.array_equal(forest.apply(rows), expected_leaves)
+        assert np.allclose(forest.predict_proba(rows), model.predict_proba(rows), atol=1e-6)
+
+
+def test_quantized_artifact_round_trip(model, scaled_employees, tmp_path):
+    quantized = quantize_thresholds(compact_arrays(flatten_forest(model)))
+    save_flat_forest(quantized, tmp_path / 'quantized')
+    for mmap in (True, False):
+        forest = FlatForest.load(tmp_path / 'quantized', mmap=mmap)
+        assert forest.bin_edges is not None and forest.threshold.dtype == np.int16
+        assert np.array_equal(forest.predict_proba(scaled_employees), FlatForest(quantized).predict_proba(scaled_employees))
+
+
+def test_select_trees_averages_only_the_chosen_trees(model, scaled_employees):
+    trees = [3, 17, 42, 98]
+    forest = FlatForest(select_trees(flatten_forest(model), trees))
+    expected = np.mean([model.estimators_[t].predict_proba(scaled_employees.astype(np.float32)) for t in trees], axis=0)
+    assert forest.n_trees == len(trees)
+    assert np.allclose(forest.predict_proba(scaled_employees), expected)
+
+
+def test_prune_depth_matches_sklearn_decision_path_at_that_depth(model, scaled_employees):
+    # The pruned tree predicts the value of the node each row reaches at max_depth (or its leaf, if shallower)
+    max_depth = 4
+    forest = FlatForest(prune_depth(flatten_forest(model), max_depth))
+    assert forest.max_depth == max_depth
+    rows = scaled_employees[:200].astype(np.float32)
+    expected = np.zeros((len(rows), len(model.classes_)))
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        node = np.zeros(len(rows), dtype=np.intp)
+        for _ in range(max_depth):
+            internal = tree.children_left[node] != -1
+            go_left = rows[np.arange(len(rows)), tree.feature[node]] <= tree.threshold[node]
+            node = np.where(internal, np.where(go_left, tree.children_left[node], tree.children_right[node]), node)
+        expected += tree.value[node, 0]
+    assert np.allclose(forest.predict_proba(rows), expected / len(model.estimators_))
+
+
+def test_committed_variants_load():
+    for name in ('compact', 'float32', 'quantized'):
+        forest = FlatForest.load(f'model_variants/{name}')
+        assert forest.predict_proba(np.zeros((1, forest.n_features_in_))).shape == (1, 2)
+
+
+def test_app_serves_a_variant_with_the_flat_engine():
+    # ENGINE is read when app.py is imported, so check it in a fresh interpreter
+    code = "import app; state = app.load_serving_model(None); print(app.ENGINE, type(state.model).__name__, state.model.n_trees)"
+    env = {**os.environ, 'ATTRITION_MODEL_VARIANT': 'compact', 'ATTRITION_ENGINE': 'sklearn'}
+    output = subprocess.run([sys.executable, '-W', 'ignore', '-c', code], env=env, capture_output=True, text=True, check=True).stdout
+    assert output.splitlines()[-1] == 'flat FlatForest 50'
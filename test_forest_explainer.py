@@ -0,0 +1,85 @@
+# test_forest_explainer.py
+# Tests for the per-feature explanations (forest_explainer.py) and the /explain endpoint.
+# Run with: python -m pytest test_forest_explainer.py
+
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+import app
+from forest_engine import FlatForest, flatten_forest, fold_scaler
+from forest_explainer import ForestExplainer
+from scoring import prepare_features
+
+
+@pytest.fixture(scope='module')
+def model():
+    with open('model.pkl', 'rb') as f:
+        return pickle.load(f)
+
+
+@pytest.fixture(scope='module')
+def scaler():
+    with open('scaler.pkl', 'rb') as f:
+        return pickle.load(f)
+
+
+@pytest.fixture(scope='module')
+def employees():
+    feature_matrix, _ = prepare_features(pd.read_csv('employee_data.csv'))
+    return feature_matrix
+
+
+def test_contributions_add_up_to_the_probability(model, scaler, employees):
+    explainer = ForestExplainer.from_model(model)
+    scaled = scaler.transform(employees)
+    proba, contributions = explainer.explain(scaled)
+    assert np.array_equal(proba, model.predict_proba(scaled))
+    assert np.allclose(explainer.bias + contributions.sum(axis=1), proba[:, 1], rtol=0, atol=1e-12)
+    assert np.isclose(explainer.bias, np.mean([estimator.tree_.value[0, 0, 1] for estimator in model.estimators_]))
+
+
+def test_contributions_match_a_path_walk(model, scaler, employees):
+    # Reference: follow each tree's decision path with sklearn and credit every value change to its split feature
+    explainer = ForestExplainer.from_model(model)
+    scaled = scaler.transform(employees[:5])
+    expected = np.zeros_like(scaled)
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        paths = estimator.decision_path(scaled.astype(np.float32))
+        for i in range(len(scaled)):
+            nodes = paths.indices[paths.indptr[i]:paths.indptr[i + 1]]
+            for parent, child in zip(nodes[:-1], nodes[1:]):
+                expected[i, tree.feature[parent]] += tree.value[child, 0, 1] - tree.value[parent, 0, 1]
+    expected /= len(model.estimators_)
+    assert np.allclose(explainer.explain(scaled)[1], expected, rtol=0, atol=1e-12)
+
+
+def test_fused_forest_explains_raw_rows(model, scaler, employees):
+    plain = ForestExplainer.from_model(model)
+    fused = ForestExplainer(FlatForest(fold_scaler(flatten_forest(model), scaler)))
+    proba, contributions = fused.explain(employees)
+    expected_proba, expected_contributions = plain.explain(scaler.transform(employees))
+    assert np.array_equal(proba, expected_proba)
+    assert np.array_equal(contributions, expected_contributions)
+
+
+def test_explain_endpoint_single_and_batch(employees):
+    client = app.app.test_client()
+    records = [dict(zip(app.expected_features_order, row)) for row in employees[:3].tolist()]
+    single = client.post('/explain?top=3', json=records[0])
+    assert single.status_code == 200
+    explanation = single.json
+    prediction = client.post('/predict', json=records[0]).json
+    for key in ('prediction', 'probability_yes_attrition', 'model_version'):
+        assert explanation[key] == prediction[key]
+    assert set(explanation['contributions']) == set(app.expected_features_order)
+    assert np.isclose(explanation['bias'] + sum(explanation['contributions'].values()), explanation['probability_yes_attrition'])
+    top = [factor['contribution'] for factor in explanation['top_factors']]
+    assert len(top) == 3 and top == sorted(top, key=abs, reverse=True)
+
+    batch = client.post('/explain', json=records + [{'Age': 30}]).json
+    assert batch['n_rows'] == 4 and batch['n_errors'] == 1
+    assert batch['explanations'][0]['contributions'] == explanation['contributions']
+    assert 'error' in batch['explanations'][3]
+    assert client.post('/explain', json={'Age': 30}).status_code == 400
@@ -0,0 +1,66 @@
+# test_instrumentation.py
+# Tests for the metrics and slow request profiler (instrumentation.py) and the /metrics endpoint.
+# Run with: python -m pytest test_instrumentation.py
+
+import os
+import time
+import app
+import instrumentation
+from instrumentation import Histogram, SlowRequestProfiler
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram('test_seconds', 'Test.', ['stage'], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, 'forest')
+    lines = histogram.render()
+    assert 'test_seconds_bucket{stage="forest",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="forest",le="1"} 3' in lines
+    assert 'test_seconds_bucket{stage="forest",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{stage="forest"} 4' in lines
+    assert 'test_seconds_sum{stage="forest"} 4.05' in lines
+
+
+def test_metrics_endpoint_reports_requests_and_stages():
+    client = app.app.test_client()
+    employee = {feature: 1 for feature in app.expected_features_order}
+    assert client.post('/predict', json=employee).status_code == 200
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'attrition_requests_total{endpoint="/predict",status="200"}' in body
+    assert 'attrition_request_duration_seconds_count{endpoint="/predict"}' in body
+    for stage in ('parse_json', 'build_features', 'score', 'forest', 'format_response'):
+        assert f'attrition_stage_duration_seconds_count{{stage="{stage}"}}' in body
+    assert 'attrition_rows_scored_total{endpoint="/predict"}' in body
+    assert 'attrition_model_info{' in body
+
+
+def test_disabled_metrics_record_nothing(monkeypatch):
+    monkeypatch.setattr(instrumentation, 'METRICS_ENABLED', False)
+    before = instrumentation.STAGE_LATENCY.count('disabled-stage')
+    with instrumentation.stage('disabled-stage'):
+        pass
+    assert instrumentation.STAGE_LATENCY.count('disabled-stage') == before
+
+
+def test_slow_request_profiler_writes_folded_stacks(tmp_path):
+    profiler = SlowRequestProfiler(threshold_ms=20, interval_ms=1, output_dir=str(tmp_path))
+
+    def busy_handler(seconds):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+
+    profiler.begin()
+    busy_handler(0.002)
+    profiler.end('/predict', 0.002) # fast: nothing written
+    profiler.begin()
+    start = time.perf_counter()
+    busy_handler(0.1)
+    profiler.end('/predict', time.perf_counter() - start)
+
+    files = os.listdir(tmp_path)
+    assert len(files) == 1 and '_predict_' in files[0] and files[0].endswith('ms.folded')
+    with open(tmp_path / files[0]) as f:
+        lines = f.read().splitlines()
+    assert lines and all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+    assert any('busy_handler (test_instrumentation.py' in line for line in lines)
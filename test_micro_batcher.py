@@ -0,0 +1,111 @@
+# test_micro_batcher.py
+# Tests for request coalescing of single-row predictions (micro_batcher.py).
+# Run with: python -m pytest test_micro_batcher.py
+
+import threading
+import time
+from concurrent.futures import TimeoutError
+import numpy as np
+import pytest
+from micro_batcher import MicroBatcher
+
+
+class RecordingScorer:
+    # score_fn that remembers every batch it was called with; the prediction of a row is its first value
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.batches = []
+
+    def __call__(self, matrix, context):
+        self.batches.append((len(matrix), context))
+        time.sleep(self.delay)
+        return matrix[:, 0].copy(), np.column_stack([matrix[:, 0], -matrix[:, 0]])
+
+
+def test_batch_is_scored_when_full():
+    scorer = RecordingScorer()
+    batcher = MicroBatcher(scorer, max_batch_rows=4, max_wait_ms=200)
+    futures = [batcher.submit([i, 0.0]) for i in range(10)]
+    results = [future.result(timeout=5) for future in futures]
+    batcher.close()
+    assert [raw_prediction for raw_prediction, _ in results] == list(range(10))
+    assert np.array_equal(results[3][1], [3.0, -3.0])
+    assert [size for size, _ in scorer.batches] == [4, 4, 2]
+    assert batcher.stats()['rows_scored'] == 10
+
+
+def test_partial_batch_is_scored_after_max_wait():
+    scorer = RecordingScorer()
+    batcher = MicroBatcher(scorer, max_batch_rows=64, max_wait_ms=50)
+    start = time.perf_counter()
+    prediction, proba = batcher.score(np.array([[7.0, 1.0]]))
+    elapsed = time.perf_counter() - start
+    batcher.close()
+    assert prediction.tolist() == [7.0] and proba.shape == (1, 2)
+    assert 0.04 <= elapsed < 1.0
+    assert scorer.batches == [(1, None)]
+
+
+def test_rows_with_different_contexts_are_never_scored_together():
+    scorer = RecordingScorer()
+    batcher = MicroBatcher(scorer, max_batch_rows=64, max_wait_ms=100)
+    old_model, new_model = object(), object()
+    futures = [batcher.submit([i], context=old_model if i % 2 else new_model) for i in range(6)]
+    results = [future.result(timeout=5)[0] for future in futures]
+    batcher.close()
+    assert results == list(range(6))
+    assert sorted((size, context is old_model) for size, context in scorer.batches) == [(3, False), (3, True)]
+
+
+def test_score_fn_exception_is_passed_to_every_caller():
+    def failing_score_fn(matrix, context):
+        raise ValueError('model exploded')
+
+    batcher = MicroBatcher(failing_score_fn, max_batch_rows=3, max_wait_ms=100)
+    futures = [batcher.submit([i]) for i in range(3)]
+    for future in futures:
+        with pytest.raises(ValueError, match='model exploded'):
+            future.result(timeout=5)
+    # The worker survives and keeps serving
+    batcher.score_fn = RecordingScorer()
+    assert batcher.score(np.array([[1.0]]))[0].tolist() == [1.0]
+    batcher.close()
+
+
+def test_rows_of_different_lengths_fail_without_killing_the_worker():
+    batcher = MicroBatcher(RecordingScorer(), max_batch_rows=2, max_wait_ms=100)
+    futures = [batcher.submit([1.0, 2.0]), batcher.submit([1.0, 2.0, 3.0])]
+    for future in futures:
+        with pytest.raises(ValueError):
+            future.result(timeout=5)
+    assert batcher.score(np.array([[5.0, 0.0]]))[0].tolist() == [5.0]
+    batcher.close()
+
+
+def test_close_drains_queued_rows():
+    scorer = RecordingScorer(delay=0.02)
+    batcher = MicroBatcher(scorer, max_batch_rows=2, max_wait_ms=1)
+    futures = [batcher.submit([i]) for i in range(8)]
+    batcher.close()
+    assert all(future.done() for future in futures)
+    assert [future.result()[0] for future in futures] == list(range(8))
+    with pytest.raises(RuntimeError):
+        batcher.submit([1.0])
+
+
+def test_score_times_out_instead_of_hanging():
+    release = threading.Event()
+
+    def stuck_score_fn(matrix, context):
+        release.wait()
+        return matrix[:, 0], np.zeros((len(matrix), 2))
+
+    batcher = MicroBatcher(stuck_score_fn, max_batch_rows=1, max_wait_ms=1, timeout=0.05)
+    assert batcher.timeout == 0.05
+    with pytest.raises(TimeoutError):
+        batcher.score(np.array([[1.0]]))
+    release.set()
+    batcher.close()
+    default_batcher = MicroBatcher(stuck_score_fn, max_wait_ms=2)
+    assert default_batcher.timeout > default_batcher.max_wait
+    default_batcher.close()
@@ -0,0 +1,121 @@
+# test_model_registry.py
+# Tests for the versioned model registry (model_registry.py) and the API's hot swap between versions:
+# publish / activate / rollback, model_version in responses, and a broken version never going live.
+# Run with: python -m pytest test_model_registry.py
+
+import os
+import time
+import pytest
+import app
+from model_registry import ModelRegistry
+
+
+ADMIN_HEADERS = {'X-Admin-Token': 'secret'}
+
+
+@pytest.fixture
+def registry(tmp_path):
+    # Two published versions of the committed model (v0002 active), and the app pointed at them
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    for _ in range(2):
+        registry.publish({'model.pkl': 'model.pkl', 'scaler.pkl': 'scaler.pkl'}, metadata={'accuracy': 0.87})
+    return registry
+
+
+@pytest.fixture
+def client(registry, monkeypatch):
+    # A watcher thread started by an earlier test must not swap versions behind this test's back
+    app.stop_model_watcher()
+    monkeypatch.setattr(app, 'registry', registry)
+    monkeypatch.setattr(app, 'serving', None)
+    monkeypatch.setattr(app, 'ENGINE', 'sklearn')
+    monkeypatch.setattr(app, 'RELOAD_INTERVAL', 0) # swaps are triggered explicitly in these tests
+    monkeypatch.setattr(app, 'CACHE_SIZE', 0)
+    monkeypatch.setattr(app, 'MICROBATCH_ENABLED', False)
+    monkeypatch.setattr(app, 'ADMIN_TOKEN', ADMIN_HEADERS['X-Admin-Token'])
+    yield app.app.test_client()
+    app.stop_model_watcher()
+
+
+def employee():
+    return {feature: 1 for feature in app.expected_features_order}
+
+
+def test_publish_activate_and_rollback(registry):
+    assert [entry['version'] for entry in registry.list_versions()] == ['v0001', 'v0002']
+    assert registry.current_version() == 'v0002'
+    assert registry.metadata('v0001')['accuracy'] == 0.87
+    assert registry.previous_version() == 'v0001'
+    assert registry.rollback() == 'v0001'
+    assert registry.current_version() == 'v0001'
+    with pytest.raises(ValueError):
+        registry.rollback()
+    registry.activate('v0002')
+    assert registry.current_version() == 'v0002'
+    with pytest.raises(KeyError):
+        registry.activate('v0099')
+    assert not [name for name in os.listdir(registry.root) if name.startswith('.staging')]
+
+
+def test_responses_report_the_version_and_follow_the_pointer(client, registry):
+    response = client.post('/predict', json=employee())
+    assert response.status_code == 200 and response.json['model_version'] == 'v0002'
+    batch = client.post('/predict_batch', json=[employee(), employee()]).json
+    assert batch['model_version'] == 'v0002'
+
+    # What the watcher thread does when models/CURRENT moves
+    registry.activate('v0001')
+    app.reload_model(registry.current_version())
+    swapped = client.post('/predict', json=employee()).json
+    assert swapped['model_version'] == 'v0001'
+    assert swapped['probability_yes_attrition'] == response.json['probability_yes_attrition']
+
+
+def test_watcher_follows_the_pointer_and_stops(client, registry, monkeypatch):
+    monkeypatch.setattr(app, 'RELOAD_INTERVAL', 0.01)
+    assert client.post('/predict', json=employee()).json['model_version'] == 'v0002' # starts the watcher
+    watcher = app._watcher_thread
+    assert watcher is not None and watcher.is_alive()
+    registry.activate('v0001')
+    deadline = time.perf_counter() + 5
+    while app.serving.version != 'v0001' and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert app.serving.version == 'v0001'
+    app.stop_model_watcher()
+    assert not watcher.is_alive()
+    # A watcher also exits by itself once hot reload is turned off
+    app.load_model()
+    watcher = app._watcher_thread
+    monkeypatch.setattr(app, 'RELOAD_INTERVAL', 0)
+    watcher.join(5)
+    assert not watcher.is_alive()
+    app.stop_model_watcher()
+
+
+def test_admin_endpoints(client, registry):
+    listing = client.get('/admin/models', headers=ADMIN_HEADERS).json
+    assert listing['current'] == 'v0002' and len(listing['versions']) == 2
+    assert client.post('/admin/models/v0001/activate', headers=ADMIN_HEADERS).json == {'current': 'v0001', 'serving': 'v0001'}
+    assert client.post('/admin/models/v0042/activate', headers=ADMIN_HEADERS).status_code == 404
+    assert client.post('/admin/models/rollback', headers=ADMIN_HEADERS).json == {'current': 'v0002', 'serving': 'v0002'}
+    assert client.post('/predict', json=employee()).json['model_version'] == 'v0002'
+
+
+def test_broken_version_is_rejected_and_old_one_keeps_serving(client, registry):
+    registry.publish({'model.pkl': 'model.pkl'}, activate=False) # v0003 has no scaler.pkl
+    response = client.post('/admin/models/v0003/activate', headers=ADMIN_HEADERS)
+    assert response.status_code == 500
+    assert registry.current_version() == 'v0002'
+    assert client.post('/predict', json=employee()).json['model_version'] == 'v0002'
+
+
+def test_admin_token(client, registry, monkeypatch):
+    assert client.get('/admin/models').status_code == 403
+    assert client.get('/admin/models', headers={'X-Admin-Token': 'wrong'}).status_code == 403
+    assert client.get('/admin/models', headers=ADMIN_HEADERS).status_code == 200
+    # Without a configured token the admin endpoints are closed to everyone
+    monkeypatch.setattr(app, 'ADMIN_TOKEN', None)
+    assert client.get('/admin/models', headers=ADMIN_HEADERS).status_code == 403
+    assert client.post('/admin/models/v0001/activate').status_code == 403
+    assert client.post('/admin/models/rollback').status_code == 403
+    assert registry.current_version() == 'v0002'
@@ -0,0 +1,77 @@
+# test_prediction_cache.py
+# Tests for the LRU prediction cache (prediction_cache.py): eviction, TTL, invalidation on model change
+# and persistence across restarts.
+# Run with: python -m pytest test_prediction_cache.py
+
+import os
+import numpy as np
+import prediction_cache
+from prediction_cache import PredictionCache
+
+
+def fake_score(rows):
+    # Stand-in for score_matrix(): label = first feature, probabilities derived from it
+    prediction = rows[:, 0].astype(int)
+    return prediction, np.column_stack([1.0 - rows[:, 0] / 10, rows[:, 0] / 10])
+
+
+def counting_score(calls):
+    def score_fn(rows):
+        calls.append(len(rows))
+        return fake_score(rows)
+    return score_fn
+
+
+def test_only_misses_are_scored_and_results_match():
+    cache = PredictionCache(max_entries=10)
+    calls = []
+    rows = np.array([[1.0, 2.0], [3.0, 4.0]])
+    first = cache.score(rows, counting_score(calls))
+    second = cache.score(np.array([[3.0, 4.0], [1.0, 2.0], [5.0, 6.0]]), counting_score(calls))
+    assert calls == [2, 1]
+    assert np.array_equal(second[0], [3, 1, 5])
+    assert np.array_equal(second[1][:2], first[1][::-1])
+    assert cache.stats()['hits'] == 2
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_entries=2)
+    cache.put('a', 0, [1.0, 0.0])
+    cache.put('b', 0, [1.0, 0.0])
+    cache.get('a')
+    cache.put('c', 1, [0.0, 1.0])
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    cache = PredictionCache(max_entries=10, ttl_seconds=5)
+    cache.put('a', 0, [1.0, 0.0])
+    now = prediction_cache.time.time()
+    monkeypatch.setattr(prediction_cache.time, 'time', lambda: now + 10)
+    assert cache.get('a') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_changed_model_file_invalidates_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(prediction_cache, 'FINGERPRINT_CHECK_INTERVAL', 0)
+    model_file = tmp_path / 'model.pkl'
+    model_file.write_bytes(b'old model')
+    cache = PredictionCache(max_entries=10, watch_paths=[model_file])
+    cache.put('a', 0, [1.0, 0.0])
+    model_file.write_bytes(b'retrained model')
+    os.utime(model_file, ns=(0, 0))
+    assert cache.get('a') is None
+    assert cache.stats()['invalidations'] == 1
+
+
+def test_entries_survive_restart_when_persisted(tmp_path):
+    store = tmp_path / 'cache.db'
+    cache = PredictionCache(max_entries=10, persist_path=str(store))
+    cache.score(np.array([[1.0, 2.0]]), fake_score)
+    restarted = PredictionCache(max_entries=10, persist_path=str(store))
+    calls = []
+    prediction, prediction_proba = restarted.score(np.array([[1.0, 2.0]]), counting_score(calls))
+    assert calls == []
+    assert prediction[0] == 1 and np.allclose(prediction_proba[0], [0.9, 0.1])
@@ -0,0 +1,80 @@
+# test_training_pipeline.py
+# Tests for the cached data stage, hyperparameter search and model compression step of the training pipeline
+# (training_pipeline.py).
+# Run with: python -m pytest test_training_pipeline.py
+
+import pickle
+import shutil
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+from scoring import DROP_COLUMNS, TARGET_COLUMN
+from training_pipeline import load_encoded_data, hyperparameter_search, in_bag_indices, select_trees_out_of_bag
+
+
+def label_encoded(csv_path):
+    # The original model_dev.py preprocessing
+    df = pd.read_csv(csv_path).drop(DROP_COLUMNS, axis=1)
+    for column in df.columns:
+        if not pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = LabelEncoder().fit_transform(df[column])
+    return df
+
+
+def test_encoding_matches_label_encoder_and_cache_round_trips(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    df, encodings, from_cache = load_encoded_data('employee_data.csv', cache_dir=cache_dir)
+    cached_df, cached_encodings, cached = load_encoded_data('employee_data.csv', cache_dir=cache_dir)
+    assert not from_cache and cached
+    expected = label_encoded('employee_data.csv')
+    for frame in (df, cached_df):
+        assert frame.columns.tolist() == expected.columns.tolist()
+        assert np.array_equal(frame.to_numpy(dtype=np.float64), expected.to_numpy(dtype=np.float64))
+    assert cached_encodings == encodings
+    assert encodings['OverTime'] == ['No', 'Yes']
+    assert cached_df['OverTime'].dtype == np.int8
+    # The target keeps LabelEncoder's int64, so a model fitted on it pickles the same classes_ as before
+    assert cached_df[TARGET_COLUMN].dtype == np.int64
+
+
+def test_changed_csv_is_parsed_again(tmp_path):
+    csv_path = tmp_path / 'employees.csv'
+    shutil.copy('employee_data.csv', csv_path)
+    cache_dir = str(tmp_path / 'cache')
+    load_encoded_data(str(csv_path), cache_dir=cache_dir)
+    pd.read_csv(csv_path).head(100).to_csv(csv_path, index=False)
+    df, _, from_cache = load_encoded_data(str(csv_path), cache_dir=cache_dir)
+    assert not from_cache and len(df) == 100
+
+
+def test_hyperparameter_search_ranks_on_out_of_bag_accuracy():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 5))
+    y = (X[:, 0] + 0.5 * rng.normal(size=300) > 0).astype(int)
+    results = hyperparameter_search(X, y, X[:20], grid={'n_estimators': [20, 40], 'max_depth': [None, 2]}, n_jobs=1, latency_repeats=2)
+    assert len(results) == 4
+    assert all('accuracy' not in result for result in results) # no test-set labels are involved
+    scores = [result['oob_accuracy'] for result in results]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_in_bag_indices_reproduce_each_trees_bootstrap_sample():
+    with open('model.pkl', 'rb') as f:
+        model = pickle.load(f)
+    for estimator in model.estimators_[:10]:
+        # Distinct in-bag rows == the number of training rows that reached the root
+        in_bag = in_bag_indices(estimator, 1176, 1176) # 80% of the 1,470 employees
+        assert len(np.unique(in_bag)) == estimator.tree_.n_node_samples[0]
+
+
+def test_out_of_bag_selection_returns_requested_subsets():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, 5))
+    y = (X[:, 0] + 0.5 * rng.normal(size=300) > 0).astype(int)
+    model = RandomForestClassifier(n_estimators=20, random_state=0).fit(X, y)
+    subsets = select_trees_out_of_bag(model, X, y, sizes=[3, 10])
+    assert sorted(subsets) == [3, 10]
+    assert len(subsets[3]) == 3 and len(subsets[10]) == 10
+    assert set(subsets[3]) <= set(subsets[10]) # greedy: each subset extends the smaller one
+    assert all(0 <= t < 20 for t in subsets[10])
@@ -0,0 +1,261 @@
+# training_pipeline.py
+# Reusable stages of the training pipeline in model_dev.py:
+# - load_encoded_data(): parse employee_data.csv, drop the unused columns and label-encode the text
+#   columns, caching the result as typed per-column .npy files keyed on the CSV's SHA-256.
+#   Later runs on an unchanged CSV skip parsing and encoding entirely.
+# - hyperparameter_search(): fit a grid of forests in parallel and report train time, model size,
+#   inference latency and out-of-bag accuracy for each (the test set is never used to rank them).
+# - build_model_variants() / compression_report(): smaller versions of the trained forest (cut to a
+#   maximum depth, fewer trees, float32 or quantized thresholds), saved to 'model_variants/' and compared
+#   on size, load time, latency and accuracy. app.py can serve any of them (ATTRITION_MODEL_VARIANT).
+
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score
+from forest_engine import (FlatForest, flatten_forest, save_flat_forest, prune_depth, select_trees,
+                           compact_arrays, quantize_thresholds, MODEL_VARIANTS_DIR)
+from scoring import DROP_COLUMNS, TARGET_COLUMN
+
+TRAINING_CACHE_DIR = 'training_cache'
+CACHE_META_FILE = 'meta.json'
+# Bump when the parsing / encoding rules change, so old cache entries are not reused.
+# 2: the target column keeps LabelEncoder's int64 codes.
+CACHE_FORMAT_VERSION = 2
+
+# Forest sizes and depths tried by hyperparameter_search() (None = grow trees fully, the default).
+SEARCH_GRID = {'n_estimators': [50, 100, 200, 400], 'max_depth': [None, 8, 12, 16]}
+
+# Model compression: the report file, and which depths / tree counts are built.
+COMPRESSION_REPORT_FILE = 'compression_report.json'
+PRUNE_DEPTHS = [6, 8, 10]
+TREE_SUBSET_SIZES = [10, 25, 50]
+
+
+# --- Parsed + encoded data cache ---
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _smallest_int_dtype(n_levels):
+    return next(dtype for dtype in (np.int8, np.int16, np.int32) if n_levels <= np.iinfo(dtype).max)
+
+def parse_and_encode(csv_path):
+    # Read the CSV, drop DROP_COLUMNS and encode every text column. The codes are the positions of the
+    # values in the sorted list of distinct values, exactly what LabelEncoder.fit_transform produces.
+    # Feature columns get the smallest integer dtype; the target stays int64 like LabelEncoder's output,
+    # since the fitted model keeps the label dtype in classes_ (and so in model.pkl).
+    # Returns the encoded DataFrame and {column: categories in code order}.
+    df = pd.read_csv(csv_path, engine='c')
+    df = df.drop(columns=[column for column in DROP_COLUMNS if column in df.columns])
+    encodings = {}
+    for column in df.columns:
+        if pd.api.types.is_numeric_dtype(df[column]):
+            continue
+        levels, codes = np.unique(df[column].astype(str).to_numpy(), return_inverse=True)
+        df[column] = codes.astype(np.int64 if column == TARGET_COLUMN else _smallest_int_dtype(len(levels)))
+        encodings[column] = levels.tolist()
+    return df, encodings
+
+def load_encoded_data(csv_path='employee_data.csv', cache_dir=TRAINING_CACHE_DIR, use_cache=True):
+    # Returns (encoded DataFrame, encodings, whether it came from the cache).
+    sha256 = file_sha256(csv_path)
+    entry = os.path.join(cache_dir, sha256[:16])
+    meta_path = os.path.join(entry, CACHE_META_FILE)
+    if use_cache and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('sha256') == sha256 and meta.get('format_version') == CACHE_FORMAT_VERSION:
+            df = pd.DataFrame({column: np.load(os.path.join(entry, f"{index}.npy"))
+                               for index, column in enumerate(meta['columns'])})
+            return df, meta['encodings'], True
+
+    df, encodings = parse_and_encode(csv_path)
+    if use_cache:
+        # Written to a staging directory and renamed into place, so a crashed run never leaves half an entry
+        os.makedirs(cache_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=cache_dir)
+        for index, column in enumerate(df.columns):
+            np.save(os.path.join(staging, f"{index}.npy"), df[column].to_numpy())
+        with open(os.path.join(staging, CACHE_META_FILE), 'w') as f:
+            json.dump({'format_version': CACHE_FORMAT_VERSION, 'sha256': sha256, 'source': os.path.basename(csv_path),
+                       'columns': df.columns.tolist(), 'dtypes': [str(dtype) for dtype in df.dtypes],
+                       'encodings': encodings}, f, indent=2)
+        shutil.rmtree(entry, ignore_errors=True)
+        try:
+            os.rename(staging, entry)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True) # another run cached the same CSV first
+    return df, encodings, False
+
+
+# --- Hyperparameter search ---
+def _fit_candidate(params, X_train, y_train, random_state):
+    # Each candidate fits on a single core; the search runs several candidates at once instead.
+    # oob_score only adds an out-of-bag evaluation; the trees are the same as without it.
+    start = time.perf_counter()
+    model = RandomForestClassifier(random_state=random_state, n_jobs=1, oob_score=True, **params).fit(X_train, y_train)
+    return model, time.perf_counter() - start
+
+def _median_ms(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+def hyperparameter_search(X_train, y_train, X_test, grid=SEARCH_GRID, n_jobs=-1, random_state=42, latency_repeats=20):
+    # Fits every combination in grid in parallel, then measures each model one at a time in this process
+    # (so latency numbers aren't disturbed by the other fits). Returns one result dict per candidate,
+    # best out-of-bag accuracy first: each training row is scored only by the trees that didn't see it,
+    # so candidates are ranked without touching the test set. X_test rows are only used to time predictions.
+    candidates = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    fitted = Parallel(n_jobs=n_jobs)(delayed(_fit_candidate)(params, X_train, y_train, random_state) for params in candidates)
+    X_test = np.asarray(X_test)
+    single_row = X_test[:1]
+    results = []
+    for params, (model, train_seconds) in zip(candidates, fitted):
+        flat_forest = FlatForest.from_model(model)
+        model.predict_proba(single_row) # warm up
+        results.append({
+            **params,
+            'oob_accuracy': float(model.oob_score_),
+            'train_seconds': train_seconds,
+            'model_bytes': len(pickle.dumps(model)),
+            'n_nodes': int(sum(estimator.tree_.node_count for estimator in model.estimators_)),
+            'single_row_ms_sklearn': _median_ms(lambda: model.predict_proba(single_row), latency_repeats),
+            'single_row_ms_flat': _median_ms(lambda: flat_forest.predict_proba(single_row), latency_repeats),
+            'test_batch_ms_flat': _median_ms(lambda: flat_forest.predict_proba(X_test), max(3, latency_repeats // 4)),
+        })
+    return sorted(results, key=lambda r: -r['oob_accuracy'])
+
+
+# --- Model compression ---
+def in_bag_indices(estimator, n_samples, n_samples_bootstrap):
+    # The bootstrap sample a RandomForestClassifier tree was fitted on: sklearn draws it from the
+    # tree's own random_state exactly like this (sklearn.ensemble._forest._generate_sample_indices).
+    return np.random.RandomState(estimator.random_state).randint(0, n_samples, n_samples_bootstrap, dtype=np.int32)
+
+def _n_samples_bootstrap(model, n_samples):
+    if model.max_samples is None:
+        return n_samples
+    if isinstance(model.max_samples, float):
+        return max(round(n_samples * model.max_samples), 1)
+    return model.max_samples
+
+def select_trees_out_of_bag(model, X_train, y_train, sizes=TREE_SUBSET_SIZES):
+    # Greedy forward selection: repeatedly add the tree that gives the best out-of-bag accuracy
+    # (ties broken by the lower Brier score), where each training row is only voted on by the chosen
+    # trees that did not see it while fitting. No rows are taken away from training or from the test set.
+    # Returns {size: sorted tree indices}.
+    if not model.bootstrap:
+        raise ValueError("Out-of-bag tree selection needs a forest fitted with bootstrap=True.")
+    X_train, is_positive = np.asarray(X_train), np.asarray(y_train) == model.classes_[1]
+    n_samples, n_trees = len(X_train), len(model.estimators_)
+    n_bootstrap = _n_samples_bootstrap(model, n_samples)
+    out_of_bag = np.ones((n_trees, n_samples), dtype=bool)
+    for t, estimator in enumerate(model.estimators_):
+        out_of_bag[t, in_bag_indices(estimator, n_samples, n_bootstrap)] = False
+    X_float32 = X_train.astype(np.float32)
+    votes = np.stack([estimator.predict_proba(X_float32)[:, 1] for estimator in model.estimators_]) * out_of_bag
+
+    total, count = np.zeros(n_samples), np.zeros(n_samples)
+    selected, remaining, subsets = [], list(range(n_trees)), {}
+    for _ in range(min(max(sizes), n_trees)):
+        # Score every remaining tree as the next one at once: (remaining trees x rows)
+        candidate_total, candidate_count = total + votes[remaining], count + out_of_bag[remaining]
+        covered = candidate_count > 0
+        proba = np.divide(candidate_total, candidate_count, out=np.zeros_like(candidate_total), where=covered)
+        n_covered = np.maximum(covered.sum(axis=1), 1)
+        accuracy = (((proba > 0.5) == is_positive) & covered).sum(axis=1) / n_covered
+        brier = (((proba - is_positive) ** 2) * covered).sum(axis=1) / n_covered
+        best = remaining[np.lexsort((brier, -accuracy))[0]]
+        selected.append(best)
+        remaining.remove(best)
+        total, count = total + votes[best], count + out_of_bag[best]
+        if len(selected) in sizes:
+            subsets[len(selected)] = sorted(selected)
+    return subsets
+
+def build_model_variants(model, X_train, y_train, depths=PRUNE_DEPTHS, tree_counts=TREE_SUBSET_SIZES):
+    # Flattened-forest arrays of every variant, by name. All of them are fed scaled rows, like model_flat/.
+    # - depth_<d>: every tree cut at depth d (the cut nodes predict their training class mix)
+    # - trees_<n>: the n trees picked by select_trees_out_of_bag()
+    # - float32: same leaves as the full forest, half the bytes (see compact_arrays)
+    # - quantized: float32 plus int16 threshold bin numbers (see quantize_thresholds), same leaves
+    # - compact: 50 trees cut at depth 10 and quantized, the three combined
+    arrays = flatten_forest(model)
+    variants = {}
+    for depth in depths:
+        if depth < int(arrays['max_depth']):
+            variants[f'depth_{depth}'] = prune_depth(arrays, depth)
+    subsets = select_trees_out_of_bag(model, X_train, y_train, tree_counts)
+    for n_trees, trees in subsets.items():
+        if n_trees < len(model.estimators_):
+            variants[f'trees_{n_trees}'] = select_trees(arrays, trees)
+    variants['float32'] = compact_arrays(arrays)
+    variants['quantized'] = quantize_thresholds(variants['float32'])
+    compact = select_trees(arrays, subsets[50]) if 50 in subsets and 50 < len(model.estimators_) else arrays
+    if int(compact['max_depth']) > 10:
+        compact = prune_depth(compact, 10)
+    variants['compact'] = quantize_thresholds(compact_arrays(compact))
+    return variants
+
+def save_model_variants(variants, directory=MODEL_VARIANTS_DIR):
+    # Built in a staging directory and swapped in whole, so no variant from an earlier run is left behind
+    parent = os.path.dirname(os.path.abspath(directory))
+    staging = tempfile.mkdtemp(prefix='.variants-', dir=parent)
+    for name, arrays in variants.items():
+        save_flat_forest(arrays, os.path.join(staging, name))
+    shutil.rmtree(directory, ignore_errors=True)
+    os.rename(staging, directory)
+
+def _directory_bytes(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+def compression_report(model, X_test, y_test, directory=MODEL_VARIANTS_DIR, latency_repeats=20):
+    # One row per artifact: the pickled sklearn model, the flattened forest, then every saved variant.
+    # load_ms reads the whole artifact into memory; latency is the median single-row / test-set predict_proba.
+    X_test = np.asarray(X_test)
+    single_row = X_test[:1]
+    reference = model.predict_proba(X_test)
+
+    def measure(name, forest, n_bytes, load):
+        forest.predict_proba(single_row) # warm up
+        proba = forest.predict_proba(X_test)
+        return {
+            'variant': name,
+            'n_trees': len(forest.estimators_) if hasattr(forest, 'estimators_') else forest.n_trees,
+            'max_depth': int(max(e.tree_.max_depth for e in forest.estimators_)) if hasattr(forest, 'estimators_') else forest.max_depth,
+            'bytes': n_bytes,
+            'load_ms': _median_ms(load, 5),
+            'single_row_ms': _median_ms(lambda: forest.predict_proba(single_row), latency_repeats),
+            'test_batch_ms': _median_ms(lambda: forest.predict_proba(X_test), max(3, latency_repeats // 4)),
+            'accuracy': float(accuracy_score(y_test, forest.classes_.take(np.argmax(proba, axis=1)))),
+            'max_proba_change': float(np.abs(proba - reference).max()),
+        }
+
+    pickled = pickle.dumps(model)
+    results = [measure('sklearn', model, len(pickled), lambda: pickle.loads(pickled))]
+    with tempfile.TemporaryDirectory() as flat_dir:
+        save_flat_forest(flatten_forest(model), flat_dir)
+        results.append(measure('flat', FlatForest.load(flat_dir), _directory_bytes(flat_dir),
+                               lambda: FlatForest.load(flat_dir, mmap=False)))
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        results.append(measure(name, FlatForest.load(path), _directory_bytes(path),
+                               lambda: FlatForest.load(path, mmap=False)))
+    return results